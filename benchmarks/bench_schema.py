@@ -0,0 +1,55 @@
+"""Compare converting config values once with a Schema against converting
+them on every access, as consumers of INI configs usually do.
+
+    python benchmarks/bench_schema.py
+"""
+
+import timeit
+from collections import OrderedDict
+
+from confight import Schema, coerce_bool, coerce_duration, coerce_int
+
+SECTIONS = 50
+READS = 100000
+
+config = OrderedDict(
+    (
+        "section{}".format(n),
+        OrderedDict([("port", str(8000 + n)), ("debug", "yes"), ("timeout", "1m 30s")]),
+    )
+    for n in range(SECTIONS)
+)
+schema = Schema(
+    {
+        "section{}".format(n): {"port": int, "debug": bool, "timeout": "duration"}
+        for n in range(SECTIONS)
+    }
+)
+
+
+def naive():
+    section = config["section7"]
+    return (
+        coerce_int(section["port"]),
+        coerce_bool(section["debug"]),
+        coerce_duration(section["timeout"]),
+    )
+
+
+def compiled(typed=schema.apply(config)):
+    section = typed["section7"]
+    return section["port"], section["debug"], section["timeout"]
+
+
+def main():
+    apply_time = timeit.timeit(lambda: schema.apply(config), number=100) / 100
+    naive_time = timeit.timeit(naive, number=READS)
+    compiled_time = timeit.timeit(compiled, number=READS)
+    print("schema.apply for {} sections: {:.1f}us".format(SECTIONS, apply_time * 1e6))
+    print("{} reads converting on access: {:.3f}s".format(READS, naive_time))
+    print("{} reads of converted values:  {:.3f}s".format(READS, compiled_time))
+    print("speedup: {:.1f}x".format(naive_time / compiled_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,48 @@
 import argparse
+import contextvars
+import copy
+import copyreg
+import functools
 import glob
+import hashlib
+import http.client
 import io
 import itertools
 import json
 import logging
+import mmap
 import os
+import pickle
+import re
+import sqlite3
+import stat
 import sys
+import threading
+import time
+import tracemalloc
+import zipfile
 from collections import OrderedDict
-from configparser import ConfigParser, ExtendedInterpolation
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from configparser import ConfigParser, ExtendedInterpolation, ParsingError
 from logging import Logger
-from typing import IO, Any, Callable, Dict, List, Optional, Set
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlsplit
 
 import toml
+from toml.tz import TomlTz
 
 __version__: str = "2.0.0-2"
 logger: Logger = logging.getLogger("confight")
@@ -21,6 +52,245 @@ TConfigurationData = Dict[str, Any]
 TFormatLoader = Callable[[IO, str], TConfigurationData]
 TParser = Callable[[str, Optional[str]], TConfigurationData]
 TMerger = Callable[[List[TConfigurationData]], TConfigurationData]
+TLoader = Callable[..., TConfigurationData]
+TKeyPath = Union[str, Tuple[str, ...], List[str]]
+TChange = Tuple[Tuple[str, ...], Any, Any]
+
+# Placeholder for values missing from a config
+MISSING: Any = object()
+
+
+def load_apps(
+    names: List[str], loader: Optional[TLoader] = None, max_workers: Optional[int] = None, **kwargs
+) -> Dict[str, TConfigurationData]:
+    """Parse and merge the config of several applications at once
+
+    Files are discovered for all the applications before parsing any of them,
+    so each distinct file is parsed only once, even when it is shared. Every
+    application gets its own copy of the contents of shared files.
+
+    Files are parsed in parallel in several processes, see `parse_files`,
+    unless a custom parser is given, which is called in this process.
+
+    :param names: Names of the applications to load
+    :param loader: Loader function(name, **kwargs) used for each application,
+                   defaults to `load_app`
+    :param max_workers: Maximum number of processes parsing files
+    :returns: dict with the loaded config for each application name
+    """
+    the_loader: TLoader = load_app if loader is None else loader
+    the_parser: Optional[TParser] = kwargs.pop("parser", None)
+    the_merger: TMerger = kwargs.pop("merger", None) or merge
+    options = {key: kwargs.pop(key) for key in ("index", "schema") if key in kwargs}
+    the_finder = kwargs.pop("finder", None) or find
+    start = time.perf_counter() if metrics.enabled else 0.0
+    listings: Dict[str, List[str]] = {}
+
+    def finder(path: str) -> List[str]:
+        if path not in listings:
+            listings[path] = the_finder(path)
+        return listings[path]
+
+    plans = OrderedDict(
+        (name, _discover(the_loader, name, finder=finder, **kwargs)) for name in names
+    )
+    files = list(OrderedDict.fromkeys(itertools.chain.from_iterable(plans.values())))
+    if the_parser is None:
+        parsed = parse_files(files, max_workers)
+    else:
+        parsed = {file: the_parser(*file) for file in files}
+    used: Set[Tuple[str, Optional[str]]] = set()
+
+    def contents(file: Tuple[str, Optional[str]]) -> TConfigurationData:
+        """Parsed contents of a file, copied after its first use"""
+        if file in used:
+            return copy.deepcopy(parsed[file])
+        used.add(file)
+        return parsed[file]
+
+    configs = OrderedDict(
+        (name, _prepare(the_merger([contents(file) for file in plan]), **options))
+        for name, plan in plans.items()
+    )
+    if metrics.enabled:
+        metrics.inc("apps_loaded", len(configs))
+        metrics.observe("batch_load_duration_seconds", time.perf_counter() - start)
+    return configs
+
+
+def parse_files(
+    files: List[Tuple[str, Optional[str]]], max_workers: Optional[int] = None
+) -> Dict[Tuple[str, Optional[str]], TConfigurationData]:
+    """Parse many config files using several processes
+
+    Local files are parsed in parallel in a pool of processes, which send
+    their contents back pickled. URLs are fetched concurrently in threads of
+    this process, so they use the cache of `http_source`.
+
+    :param files: List of (path, format) pairs, format may be None to guess it
+    :param max_workers: Maximum number of processes parsing files
+    :returns: dict with the parsed contents for each (path, format) pair
+    """
+    urls = [file for file in files if is_url(file[0])]
+    local = [file for file in files if not is_url(file[0])]
+    parsed: Dict[Tuple[str, Optional[str]], TConfigurationData] = {}
+    if urls:
+        with ThreadPoolExecutor(max_workers=http_source.max_workers) as executor:
+            parsed.update(zip(urls, executor.map(lambda file: parse(*file), urls)))
+    workers = max_workers or os.cpu_count() or 1
+    if len(local) < 2 or workers == 1:
+        parsed.update((file, parse(*file)) for file in local)
+        return parsed
+    parsed.update(zip(local, _map_in_processes(_parse_in_process, local, workers)))
+    if metrics.enabled:  # Counted by the parsing processes, but not sent back
+        metrics.inc("files_parsed", len(local))
+        metrics.inc("bytes_read", sum(_file_size(path) for path, _ in local))
+    return parsed
+
+
+def _map_in_processes(
+    function: Callable[[str, Optional[str]], Any],
+    files: List[Tuple[str, Optional[str]]],
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """Call function(path, format) for every file in a pool of processes"""
+    paths, formats = zip(*files)
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, paths, formats, chunksize=chunksize))
+
+
+def _parse_in_process(path: str, format: Optional[str] = None) -> TConfigurationData:
+    """Parse a file in a pool process, raising errors that can be sent back"""
+    try:
+        return parse(path, format)
+    except Exception as error:
+        try:
+            pickle.loads(pickle.dumps(error))
+        except Exception:
+            raise ValueError(str(error)) from None
+        raise
+
+
+# Set while a loader runs only to list its files, see _discover
+_discovering: "contextvars.ContextVar[bool]" = contextvars.ContextVar("discovering", default=False)
+
+
+def _discover(loader: TLoader, *args, **kwargs) -> List[Tuple[str, Optional[str]]]:
+    """Return the (path, format) pairs a loader would parse, in order"""
+    for option in ("index", "schema"):
+        kwargs.pop(option, None)
+    kwargs.update(parser=lambda path, format=None: (path, format), merger=list)
+    token = _discovering.set(True)
+    try:
+        return loader(*args, **kwargs)  # type: ignore
+    finally:
+        _discovering.reset(token)
+
+
+class CheckError(NamedTuple):
+    """Error found checking a config file, line and column start at 1"""
+
+    path: str
+    line: Optional[int]
+    column: Optional[int]
+    message: str
+
+    def __str__(self) -> str:
+        position = [str(part) for part in (self.line, self.column) if part is not None]
+        return ":".join([self.path] + position + [" " + self.message])
+
+
+def check_apps(
+    names: List[str], loader: Optional[TLoader] = None, max_workers: Optional[int] = None, **kwargs
+) -> List[CheckError]:
+    """Check that the config files of several applications can be parsed
+
+    Files are discovered for all the applications and each distinct file is
+    parsed once, in parallel in several processes. Checking does not stop at
+    the first error, every file is parsed.
+
+    :param names: Names of the applications to check
+    :param loader: Loader function(name, **kwargs) used for each application,
+                   defaults to `load_app`
+    :param max_workers: Maximum number of processes parsing files
+    :returns: List of the errors found, in the order of the files
+    """
+    the_loader: TLoader = load_app if loader is None else loader
+    errors: List[CheckError] = []
+    files: Dict[Tuple[str, Optional[str]], None] = OrderedDict()
+    for name in names:
+        try:
+            files.update((file, None) for file in _discover(the_loader, name, **kwargs))
+        except Exception as error:
+            errors.append(CheckError(name, None, None, str(error)))
+    if not files:
+        return errors
+    found = _map_in_processes(_check_file, list(files), max_workers)
+    errors.extend(error for error in found if error is not None)
+    return errors
+
+
+def _check_file(path: str, format: Optional[str] = None) -> Optional[CheckError]:
+    """Parse a file returning the error found, if any"""
+    try:
+        parse(path, format)
+    except Exception as error:
+        line, column = _error_position(error)
+        return CheckError(path, line, column, " ".join(str(error).split()))
+    return None
+
+
+def _error_position(error: Exception) -> Tuple[Optional[int], Optional[int]]:
+    """Return the line and column of a parse error, when known"""
+    mark = getattr(error, "problem_mark", None)  # yaml, starting at 0
+    if mark is not None:
+        return mark.line + 1, mark.column + 1
+    if hasattr(error, "lineno"):  # json, toml and ini
+        return error.lineno, getattr(error, "colno", None)
+    if isinstance(error, ParsingError) and error.errors:
+        return error.errors[0][0], None
+    return None, None
+
+
+def get_value(
+    name: str, path: TKeyPath, default: Any = MISSING, loader: Optional[TLoader] = None, **kwargs
+) -> Any:
+    """Get a single value from the config of an application
+
+    Files are parsed from the most to the least relevant, stopping at the
+    first one with a value for the key path that is not a section, so files
+    with less precedence are not even parsed. Sections are merged from all the
+    files defining them.
+
+    Unlike `merge`, which keeps sections over other values, a value shadowing
+    a section defined in a less relevant file is returned as is.
+
+    :param name: Name of the application
+    :param path: Key path of the value, like `db.pool.size`
+    :param default: Value returned when missing
+    :param loader: Loader function(name, **kwargs) to find the files with,
+                   defaults to `load_app`
+    :returns: The value at the key path
+    :raises KeyError: When missing and no default is given
+    """
+    keys = key_path(path)
+    the_parser: TParser = kwargs.pop("parser", None) or parse  # type: ignore
+    the_merger: TMerger = kwargs.pop("merger", None) or merge
+    files = _discover(load_app if loader is None else loader, name, **kwargs)
+    sections = []
+    for file_path, format in reversed(files):
+        value = _lookup(the_parser(file_path, format), keys)
+        if isinstance(value, dict):
+            sections.append(value)
+        elif value is not MISSING and not sections:
+            return value
+    if sections:
+        return the_merger(sections[::-1])
+    if default is MISSING:
+        raise KeyError("No value at key path {!r}".format(".".join(keys)))
+    return default
 
 
 def load_user_app(
@@ -98,6 +368,8 @@ def load_paths(
     finder: Optional[Callable[[str], List[str]]] = None,
     extension: Optional[str] = None,
     force_extension: bool = False,
+    timeout: Optional[float] = None,
+    fallback: bool = False,
     **kwargs
 ) -> TConfigurationData:
     """Parse and merge config in path and directories
@@ -106,20 +378,104 @@ def load_paths(
     :param finder: Finder function(dir_path) returning ordered list of paths
     :param extension: Extension of the files to filter
     :param force_extension: Only read files with given extension.
+    :param timeout: Maximum seconds to spend finding and parsing files
+    :param fallback: On timeout, return the last config loaded from the same
+                     paths, if any, instead of raising
     :returns: Single dict with all the loaded config
+    :raises LoadTimeout: When the timeout expires
     """
     finder = find if finder is None else finder
+    if timeout is not None:
+        return _load_paths_with_timeout(
+            paths,
+            timeout,
+            fallback,
+            finder=finder,
+            extension=extension,
+            force_extension=force_extension,
+            **kwargs
+        )
     files = list(itertools.chain.from_iterable(finder(path) for path in paths))
     if extension and force_extension:
         files = [path for path in files if path.endswith("." + extension)]
     return load(files, **kwargs)
 
 
+class LoadTimeout(TimeoutError):
+    """Loading config took longer than allowed
+
+    :ivar path: Path being found or parsed when the timeout expired
+    """
+
+    def __init__(self, message: str, path: Optional[str] = None):
+        super().__init__(message)
+        self.path = path
+
+
+# Last config loaded with a timeout for each list of paths and options
+# changing the result, used as fallback
+_last_loaded: Dict[Tuple[Any, ...], TConfigurationData] = {}
+
+
+def _load_paths_with_timeout(
+    paths: List[str], timeout: float, fallback: bool, finder: Callable[[str], List[str]], **kwargs
+) -> TConfigurationData:
+    """Run load_paths in a thread, giving up on it after timeout seconds
+
+    The thread can't be interrupted, if it's blocked on a hung filesystem it
+    is left behind until the system call returns.
+    """
+    the_parser: TParser = kwargs.pop("parser", None) or parse  # type: ignore
+    visiting: List[Optional[str]] = [None]
+    outcome: Dict[str, Any] = {}
+
+    def timed_finder(path: str) -> List[str]:
+        visiting[0] = path
+        return finder(path)
+
+    def timed_parser(path: str, format: Optional[str] = None) -> TConfigurationData:
+        visiting[0] = path
+        return the_parser(path, format)
+
+    def run():
+        try:
+            outcome["config"] = load_paths(paths, timed_finder, parser=timed_parser, **kwargs)
+        except BaseException as error:
+            outcome["error"] = error
+
+    # Run in a copy of the context so the thread knows whether it's discovering
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(run,), name="confight-load", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    key = (tuple(paths),) + tuple(
+        kwargs.get(option)
+        for option in ("extension", "force_extension", "format", "merger", "index", "schema")
+    )
+    # Only merged configs are kept, not the files listed by _discover
+    keep = not _discovering.get()
+    if thread.is_alive():
+        error = LoadTimeout(
+            "Loading config timed out after {}s at {!r}".format(timeout, visiting[0]), visiting[0]
+        )
+        if fallback and keep and key in _last_loaded:
+            logger.error("%s, using last loaded config", error)
+            return _last_loaded[key]
+        raise error
+    if "error" in outcome:
+        raise outcome["error"]
+    if keep:
+        _last_loaded[key] = outcome["config"]
+    return outcome["config"]
+
+
 def load(
     paths: List[str],
     format: Optional[str] = None,
     parser: Optional[TParser] = None,
     merger: Optional[TMerger] = None,
+    index: bool = False,
+    schema: Optional["Schema"] = None,
 ) -> TConfigurationData:
     """Parse and merge a list of configuration files
 
@@ -127,6 +483,8 @@ def load(
     :param format: Format for the files to load (default: guess from extension)
     :param parser: Parse function(path, format=None) returning a dict
     :param merger: Merge function(list_of_dicts) returning a dict
+    :param index: Return a ConfigIndex allowing lookups by dotted key paths
+    :param schema: Schema to validate and convert the loaded config with
     :returns: Single dict with all the loaded config
     """
     # NOTE: Mypy bug
@@ -134,7 +492,26 @@ def load(
     # https://github.com/python/mypy/issues/16868
     the_parser: TParser = parse if parser is None else parser  # type: ignore
     the_merger: TMerger = merge if merger is None else merger
-    return the_merger([the_parser(path, format) for path in paths])
+    start = time.perf_counter() if metrics.enabled else 0.0
+    urls = [path for path in paths if is_url(path)] if parser is None else []
+    fetched = http_source.fetch_all(urls, format) if len(urls) > 1 else {}
+    config = the_merger(
+        [fetched[path] if path in fetched else the_parser(path, format) for path in paths]
+    )
+    config = _prepare(config, index, schema)
+    if metrics.enabled:
+        metrics.inc("loads")
+        metrics.observe("load_duration_seconds", time.perf_counter() - start)
+    return config
+
+
+def _prepare(
+    config: TConfigurationData, index: bool = False, schema: Optional["Schema"] = None
+) -> TConfigurationData:
+    """Apply the schema and indexing options of load to a merged config"""
+    if schema is not None:
+        config = schema.apply(config)
+    return ConfigIndex(config) if index else config
 
 
 def parse(path: str, format: Optional[str] = None) -> TConfigurationData:
@@ -144,15 +521,34 @@ def parse(path: str, format: Optional[str] = None) -> TConfigurationData:
     :param format: Name of the format (default: guess from file extension)
     :returns: dict with the parsed contents
     """
+    if is_url(path):
+        return http_source.parse(path, format)
     the_format: str = format_from_path(path) if format is None else format
     logger.info("Parsing %r config file from %r", the_format, path)
     if the_format not in FORMATS:
         raise ValueError("Unknown format {} for file {}".format(the_format, path))
     loader: TFormatLoader = FORMAT_LOADERS[the_format]
-    with io.open(path, "r", encoding="utf8") as stream:
+    bundle = _bundle_of(path)
+    if bundle is not None:
+        stream = bundle.open(os.path.basename(path))
+    else:
+        stream = io.open(path, "r", encoding="utf8")
+    with stream:
+        if metrics.enabled:
+            metrics.inc("files_parsed")
+            size = (
+                bundle.size(os.path.basename(path)) if bundle else os.fstat(stream.fileno()).st_size
+            )
+            metrics.inc("bytes_read", size)
         return loader(stream, the_format)
 
 
+def _file_size(path: str) -> int:
+    """Return the size in bytes of a config file, packed in a bundle or not"""
+    bundle = _bundle_of(path)
+    return bundle.size(os.path.basename(path)) if bundle else os.path.getsize(path)
+
+
 def merge(configs: List[TConfigurationData]) -> TConfigurationData:
     """Merge list of dicts into a single dict
 
@@ -169,11 +565,1197 @@ def merge(configs: List[TConfigurationData]) -> TConfigurationData:
     keys = OrderedDict((key, None) for config in configs for key in config)
     for key in keys:
         values = [config[key] for config in configs if key in config]
-        merges = [v for v in values if isinstance(v, dict)]
+        merges = [v for v in values if isinstance(v, _SECTIONS)]
         result[key] = merge(merges) if merges else values[-1]
     return result
 
 
+def changes(
+    old: TConfigurationData, new: TConfigurationData, path: Tuple[str, ...] = ()
+) -> Iterator[TChange]:
+    """Compare two configs yielding their differences
+
+    Sections present in both configs are compared recursively so only the
+    innermost changed keys are reported. Values are compared by type and
+    value, so `1` and `True` are different.
+
+    :param old: Previous config
+    :param new: Current config
+    :param path: Key path of the given configs
+    :returns: Iterator of (key_path, old_value, new_value), using `MISSING`
+              for added or removed keys
+    """
+    if old is new:
+        return
+    for key in old:
+        if key not in new:
+            yield path + (key,), old[key], MISSING
+    for key in new:
+        value = new[key]
+        previous = old[key] if key in old else MISSING
+        if isinstance(previous, _SECTIONS) and isinstance(value, _SECTIONS):
+            yield from changes(previous, value, path + (key,))
+        elif not _same(previous, value):
+            yield path + (key,), previous, value
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Return whether two values are equal and of the same type"""
+    if old is new:
+        return True
+    if isinstance(old, _SECTIONS) and isinstance(new, _SECTIONS):
+        return next(changes(old, new), None) is None
+    if isinstance(old, list) and isinstance(new, list):
+        return len(old) == len(new) and all(map(_same, old, new))
+    return type(old) is type(new) and old == new
+
+
+class ConfigDigest(object):
+    """Content digest of a config and, for sections, of each of its keys
+
+    Digests are canonical: they don't depend on the order of the keys and they
+    take the types into account, so `1`, `1.0`, `True` and `"1"` differ.
+    Build them with `digest_tree`.
+
+    :ivar value: The digested value
+    :ivar digest: Digest bytes of the value
+    :ivar children: ConfigDigest of each key for sections and of each item
+                    for lists
+    :ivar entry: Digest of the key and value for values in sections
+    """
+
+    __slots__ = ("value", "digest", "children", "entry")
+
+    def __init__(self, value: Any, digest: bytes, children: Dict[Any, "ConfigDigest"]):
+        self.value = value
+        self.digest = digest
+        self.children = children
+        self.entry: Optional[bytes] = None
+
+    @property
+    def hexdigest(self) -> str:
+        return self.digest.hex()
+
+    def changed(
+        self, other: "ConfigDigest", path: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[str, ...]]:
+        """Yield the innermost key paths whose contents differ
+
+        Subtrees with the same digest are skipped without visiting them.
+        """
+        if self.digest == other.digest:
+            return
+        if not (isinstance(self.value, _SECTIONS) and isinstance(other.value, _SECTIONS)):
+            yield path
+            return
+        for key in self.children:
+            if key not in other.children:
+                yield path + (key,)
+        for key, child in other.children.items():
+            if key in self.children:
+                yield from self.children[key].changed(child, path + (key,))
+            else:
+                yield path + (key,)
+
+
+def digest_tree(config: Any, previous: Optional[ConfigDigest] = None) -> ConfigDigest:
+    """Compute the digest of a config and all its sections
+
+    Digests of a `previous` tree are reused for the values found at the same
+    key paths: values that are the same objects are not visited, equal values
+    are compared instead of hashed and sections or lists whose items all kept
+    their digests are not hashed again. After a reload, even one building new
+    objects for every section, only the changed values and the sections and
+    lists holding them are hashed. Configs must not be modified in place after
+    being digested.
+
+    :param config: Config to digest
+    :param previous: Digest tree of a previous version of the config
+    :returns: ConfigDigest for the given config
+    """
+    if previous is not None and previous.value is config:
+        return previous
+    children: Dict[Any, ConfigDigest] = {}
+    if isinstance(config, _SECTIONS):
+        is_dict = previous is not None and isinstance(previous.value, _SECTIONS)
+        known = previous.children if previous is not None and is_dict else {}
+        entries = []
+        for key, value in config.items():
+            old = known.get(key)
+            child = children[key] = digest_tree(value, old)
+            if old is not None and old.entry is not None and old.digest == child.digest:
+                entry = old.entry
+            else:
+                entry = _hash(b"entry", _key_digest(key), child.digest)
+            child.entry = entry
+            entries.append(entry)
+        if previous is not None and is_dict and _same_digests(children, known):
+            digest = previous.digest
+        else:
+            digest = _hash(b"dict", *sorted(entries))
+    elif isinstance(config, (list, tuple)):
+        is_list = previous is not None and isinstance(previous.value, (list, tuple))
+        known = previous.children if previous is not None and is_list else {}
+        for position, item in enumerate(config):
+            children[position] = digest_tree(item, known.get(position))
+        if previous is not None and is_list and _same_digests(children, known):
+            digest = previous.digest
+        else:
+            digest = _hash(b"list", *(child.digest for child in children.values()))
+    elif previous is not None and _same_scalar(previous.value, config):
+        digest = previous.digest
+    else:
+        digest = _scalar_digest(config)
+    return ConfigDigest(config, digest, children)
+
+
+def _same_digests(children: Dict[Any, ConfigDigest], known: Dict[Any, ConfigDigest]) -> bool:
+    """Return whether two sets of children have the same keys and digests"""
+    return len(children) == len(known) and all(
+        key in known and known[key].digest == child.digest for key, child in children.items()
+    )
+
+
+def _same_scalar(old: Any, new: Any) -> bool:
+    """Return whether two values that aren't sections have the same digest"""
+    if type(old) is not type(new) or isinstance(new, (list, tuple)):
+        return False
+    if new is None or isinstance(new, (bool, int, str)):
+        return old == new
+    elif isinstance(new, float):
+        return repr(old) == repr(new)
+    return str(old) == str(new)
+
+
+def digest(config: TConfigurationData) -> str:
+    """Return the hexadecimal content digest of a config"""
+    return digest_tree(config).hexdigest
+
+
+def _scalar_digest(value: Any) -> bytes:
+    if value is None:
+        return _hash(b"null")
+    elif isinstance(value, bool):
+        return _hash(b"bool", str(value).encode("utf8"))
+    elif isinstance(value, int):
+        return _hash(b"int", str(value).encode("utf8"))
+    elif isinstance(value, float):
+        return _hash(b"float", repr(value).encode("utf8"))
+    elif isinstance(value, str):
+        return _hash(b"str", value.encode("utf8"))
+    return _hash(type(value).__name__.encode("utf8"), str(value).encode("utf8"))
+
+
+def _key_digest(key: Any) -> bytes:
+    return _str_digest(key) if isinstance(key, str) else _scalar_digest(key)
+
+
+@functools.lru_cache(maxsize=4096)
+def _str_digest(key: str) -> bytes:
+    """Digest of a string key, as the same keys repeat in every reload"""
+    return _scalar_digest(key)
+
+
+def _hash(tag: bytes, *parts: bytes) -> bytes:
+    return hashlib.sha256(b"%s:%s" % (tag, b"".join(parts))).digest()
+
+
+class ConfigIndex(OrderedDict):
+    """Config with a precomputed index of dotted key paths
+
+    Besides working as the indexed config, nested values can be read with a
+    single lookup, `index.get("db.pool.size", default)`, and the values under
+    a section listed with `index.items("db.")`, without walking the config.
+    The config must not be modified after being indexed. Paths are ambiguous
+    for keys containing dots.
+
+    :param config: Config to index
+    """
+
+    def __init__(self, config: Optional[TConfigurationData] = None):
+        super().__init__(config or ())
+        self._values: Dict[str, Any] = {}
+        self._leaves: Dict[str, Tuple[Tuple[str, Any], ...]] = {}
+        self._index(self, "")
+
+    def _index(self, section: TConfigurationData, prefix: str) -> Tuple[Tuple[str, Any], ...]:
+        leaves: List[Tuple[str, Any]] = []
+        for key, value in section.items():
+            path = prefix + str(key)
+            self._values[path] = value
+            if isinstance(value, _SECTIONS):
+                leaves.extend(self._index(value, path + "."))
+            else:
+                leaves.append((path, value))
+        self._leaves[prefix] = tuple(leaves)
+        return self._leaves[prefix]
+
+    def get(self, path: str, default: Any = None) -> Any:  # type: ignore
+        """Return the value at a dotted key path or default if missing"""
+        return self._values.get(path, default)
+
+    def items(self, prefix: Optional[str] = None):  # type: ignore
+        """Return the items of the config or the leaf values under prefix
+
+        :param prefix: Dotted path of a section, like `db.` or `db`, or an
+                       empty string for the whole config.
+        :returns: Config items when no prefix is given, otherwise a sequence
+                  of (dotted_path, value) for all non section values under it
+        """
+        if prefix is None:
+            return super().items()
+        if prefix and not prefix.endswith("."):
+            prefix += "."
+        return self._leaves.get(prefix, ())
+
+
+class Schema(object):
+    """Declared types of config values, compiled once into converters
+
+    Each key of a section spec declares the type of the value with either a
+    section spec, a coercer name from `COERCERS`, the builtin types `int`,
+    `float`, `bool` and `str`, a list with the spec of its items, or a custom
+    coercer function(value) raising ValueError for invalid values:
+
+        schema = Schema({"db": {"port": int, "hosts": [str], "timeout": "duration"}})
+        config = schema.apply(load_app("myapp"))
+
+    Applying it validates and converts all the declared values in a single pass
+    returning a new config. Values not declared are kept as they are.
+
+    :param spec: Spec of the whole config
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self._apply = _compile_spec(spec, ())
+
+    def apply(self, config: TConfigurationData) -> TConfigurationData:
+        """Return a copy of config with all declared values converted
+
+        :raises ValueError: With the key path of the first invalid value
+        """
+        return self._apply(config)
+
+
+def _compile_spec(spec: Any, path: Tuple[str, ...]) -> Callable[[Any], Any]:
+    """Build the converter function for the given spec"""
+    if isinstance(spec, dict):
+        converters = [(key, _compile_spec(value, path + (key,))) for key, value in spec.items()]
+
+        def convert_section(value):
+            if not isinstance(value, _SECTIONS):
+                raise _schema_error(path, value, "expected a section")
+            result = OrderedDict(value)
+            for key, converter in converters:
+                if key in value:
+                    result[key] = converter(value[key])
+            return result
+
+        return convert_section
+    elif isinstance(spec, list) and len(spec) == 1:
+        convert_item = _compile_spec(spec[0], path)
+
+        def convert_list(value):
+            if not isinstance(value, list):
+                raise _schema_error(path, value, "expected a list")
+            return [convert_item(item) for item in value]
+
+        return convert_list
+    if spec in COERCER_TYPES:
+        spec = spec.__name__
+    coercer = COERCERS.get(spec) if isinstance(spec, str) else spec
+    if not callable(coercer):
+        raise ValueError("Invalid schema spec {!r} for {!r}".format(spec, ".".join(path)))
+    the_coercer: Callable[[Any], Any] = coercer
+
+    def convert_value(value):
+        try:
+            return the_coercer(value)
+        except (TypeError, ValueError) as error:
+            raise _schema_error(path, value, error)
+
+    return convert_value
+
+
+def _schema_error(path: Tuple[str, ...], value: Any, reason: Any) -> ValueError:
+    return ValueError("Invalid value {!r} for {!r}: {}".format(value, ".".join(path), reason))
+
+
+def coerce_int(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError("expected an integer")
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError("expected an integer")
+    return int(value)
+
+
+def coerce_float(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise TypeError("expected a number")
+    return float(value)
+
+
+def coerce_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ConfigParser.BOOLEAN_STATES:
+        return ConfigParser.BOOLEAN_STATES[value.lower()]
+    raise ValueError("expected a boolean")
+
+
+def coerce_str(value: Any) -> str:
+    if isinstance(value, list) or isinstance(value, _SECTIONS):
+        raise TypeError("expected a string")
+    return value if isinstance(value, str) else str(value)
+
+
+DURATION_UNITS: Dict[str, float] = {
+    "ms": 0.001,
+    "s": 1,
+    "m": 60,
+    "h": 3600,
+    "d": 86400,
+}
+DURATION_RE = re.compile(r"(\d+(?:\.\d*)?)\s*(ms|s|m|h|d)\s*")
+
+
+def coerce_duration(value: Any) -> float:
+    """Convert durations such as `90`, `1.5`, `"250ms"` or `"1h 30m"` to seconds"""
+    if not isinstance(value, str):
+        return coerce_float(value)
+    text = value.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    total, position = 0.0, 0
+    for match in DURATION_RE.finditer(text):
+        if match.start() != position:
+            break
+        total += float(match.group(1)) * DURATION_UNITS[match.group(2)]
+        position = match.end()
+    if not text or position != len(text):
+        raise ValueError("expected a duration")
+    return total
+
+
+COERCERS: Dict[str, Callable[[Any], Any]] = {
+    "int": coerce_int,
+    "float": coerce_float,
+    "bool": coerce_bool,
+    "str": coerce_str,
+    "duration": coerce_duration,
+}
+COERCER_TYPES = (int, float, bool, str)
+
+
+def diff(old: TConfigurationData, new: TConfigurationData) -> Dict[str, Any]:
+    """Compute the changes turning a config into another one
+
+    The delta holds the digests of both configs and a list of changes:
+    `["set", key_path, value]`, `["delete", key_path]` and, when the order of
+    the keys of a section changed, `["order", key_path, keys]`. Deltas can be
+    serialized as JSON as long as the config values and keys can be written
+    as JSON and read back as they were, which excludes dates and times.
+
+    :param old: Config the delta applies to
+    :param new: Config resulting from applying the delta
+    :returns: Delta to be given to `patch`
+    """
+    operations: List[List[Any]] = []
+    _delta(old, new, [], operations)
+    return OrderedDict(base=digest(old), result=digest(new), changes=operations)
+
+
+def _delta(
+    old: TConfigurationData, new: TConfigurationData, path: List[str], operations: List[List[Any]]
+) -> None:
+    for key in old:
+        if key not in new:
+            operations.append(["delete", path + [key]])
+    for key, value in new.items():
+        previous = old[key] if key in old else MISSING
+        if isinstance(previous, _SECTIONS) and isinstance(value, _SECTIONS):
+            _delta(previous, value, path + [key], operations)
+        elif not _same(previous, value):
+            operations.append(["set", path + [key], value])
+    patched_order = [key for key in old if key in new] + [key for key in new if key not in old]
+    if patched_order != list(new):
+        operations.append(["order", path, list(new)])
+
+
+def patch(config: TConfigurationData, delta: Dict[str, Any]) -> TConfigurationData:
+    """Apply a delta made by `diff` to a config
+
+    The digests of the config and of the result are checked against the ones
+    in the delta.
+
+    :param config: Config to apply the delta to, it's not modified
+    :param delta: Delta made by `diff`
+    :returns: The patched config
+    :raises ValueError: When the config or the result don't match the delta
+    """
+    base = digest_tree(config)
+    if base.hexdigest != delta["base"]:
+        raise ValueError("Config does not match the base digest of the delta")
+    result = copy.deepcopy(config)
+    for operation in delta["changes"]:
+        action, path = operation[0], tuple(operation[1])
+        if action == "order":
+            section = _lookup(result, path)
+            reordered = [(key, section.pop(key)) for key in operation[2]]
+            section.update(reordered)
+            continue
+        parent = _lookup(result, path[:-1])
+        if action == "set":
+            parent[path[-1]] = copy.deepcopy(operation[2])
+        elif action == "delete":
+            del parent[path[-1]]
+        else:
+            raise ValueError("Unknown delta change {!r}".format(action))
+    if digest_tree(result, previous=base).hexdigest != delta["result"]:
+        raise ValueError("Patched config does not match the result digest of the delta")
+    return result
+
+
+class Overlay(Mapping):
+    """Read only view of a base config with an overlay config merged on top
+
+    Reads give the same values as `merge([base, overlay])` without copying
+    the base: only the keys of the overlay are stored, so many overlays can
+    share a big base config. Sections present in both are Overlay views too,
+    the other values are the ones from the base or the overlay as they are.
+    Neither config must be modified while in use.
+
+    Overlays are sections for the functions of this module, so they can be
+    merged, digested, compared, indexed, frozen or stacked over other
+    overlays, but they aren't dicts: use `to_dict` to dump them as JSON or
+    TOML.
+
+        base = load_app("myapp")
+        tenant = Overlay(base, load_paths(["/etc/myapp/tenants/acme"]))
+
+    :param base: Base config
+    :param overlay: Config with precedence over the base
+    """
+
+    __slots__ = ("base", "overlay", "_own", "_extra", "_length")
+
+    def __init__(self, base: TConfigurationData, overlay: TConfigurationData):
+        self.base = base
+        self.overlay = overlay
+        self._own: Dict[Any, Any] = {}
+        self._extra: List[Any] = []
+        for key, value in overlay.items():
+            if key not in base:
+                self._extra.append(key)
+                self._own[key] = value
+            elif isinstance(value, _SECTIONS) and isinstance(base[key], _SECTIONS):
+                self._own[key] = Overlay(base[key], value)
+            elif isinstance(value, _SECTIONS) or not isinstance(base[key], _SECTIONS):
+                self._own[key] = value
+        self._length = len(base) + len(self._extra)
+
+    def __getitem__(self, key: Any) -> Any:
+        # Avoid raising KeyError on the common path of reads from the base
+        if key in self._own:
+            return self._own[key]
+        return self.base[key]
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self._own:
+            return self._own[key]
+        return self.base.get(key, default)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._own or key in self.base
+
+    def __iter__(self) -> Iterator[Any]:
+        yield from self.base
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self) -> str:
+        return "Overlay({!r}, {!r})".format(self.base, self.overlay)
+
+    def to_dict(self) -> TConfigurationData:
+        """Return the merged config as a new dict"""
+        return merge([self.base, self.overlay])
+
+
+# Types of the sections of a config, see Overlay
+_SECTIONS: Any = (dict, Overlay)
+
+
+def load_overlay(base: TConfigurationData, paths: List[str], **kwargs) -> Overlay:
+    """Load config from paths as an Overlay on top of a base config
+
+    Accepts the same arguments as `load_paths`.
+
+    :param base: Base config, shared by all the overlays
+    :param paths: List of files and directories of the overlay
+    :returns: Overlay with the loaded config over the base
+    """
+    return Overlay(base, load_paths(paths, **kwargs))
+
+
+def key_path(path: TKeyPath) -> Tuple[str, ...]:
+    """Split a dotted key path such as `db.pool.size` into its keys"""
+    if isinstance(path, str):
+        return tuple(path.split(".")) if path else ()
+    return tuple(path)
+
+
+def _lookup(config: Any, path: Tuple[str, ...], default: Any = MISSING) -> Any:
+    """Get the value at the given key path of a config"""
+    for key in path:
+        if not isinstance(config, _SECTIONS) or key not in config:
+            return default
+        config = config[key]
+    return config
+
+
+class Subscriptions(object):
+    """Notify subscribers when the config under their key paths changes
+
+    Each new config given to `update` is compared against the previous one,
+    only along the subscribed key paths and stopping at the first difference,
+    so unrelated changes cost nothing to the subscribers.
+
+        subscriptions = Subscriptions(load_app("myapp"))
+        subscriptions.subscribe("db.pool", pool.resize)
+        ...
+        subscriptions.reload(load_app, "myapp")
+    """
+
+    def __init__(self, config: Optional[TConfigurationData] = None):
+        self.config: TConfigurationData = OrderedDict() if config is None else config
+        self._subscribers: List[Tuple[Tuple[str, ...], Callable[[Any, Any], Any]]] = []
+
+    def subscribe(self, path: TKeyPath, callback: Callable[[Any, Any], Any]) -> None:
+        """Call `callback(old_value, new_value)` when the value at path changes
+
+        Values are `MISSING` when the key path is not present in the config.
+        """
+        self._subscribers.append((key_path(path), callback))
+
+    def unsubscribe(self, path: TKeyPath, callback: Callable[[Any, Any], Any]) -> None:
+        """Stop calling callback for changes at path"""
+        self._subscribers.remove((key_path(path), callback))
+
+    def update(self, config: TConfigurationData) -> List[Tuple[str, ...]]:
+        """Replace the config, notifying the subscribers of changed paths
+
+        :param config: The new config
+        :returns: List of the subscribed key paths that changed
+        """
+        old, self.config = self.config, config
+        changed: Dict[Tuple[str, ...], bool] = OrderedDict()
+        for path, callback in list(self._subscribers):
+            old_value, new_value = _lookup(old, path), _lookup(config, path)
+            if path not in changed:
+                changed[path] = not _same(old_value, new_value)
+            if changed[path]:
+                callback(old_value, new_value)
+        return [path for path, is_changed in changed.items() if is_changed]
+
+    def reload(self, loader: TLoader, *args, **kwargs) -> List[Tuple[str, ...]]:
+        """Update the config with the result of `loader(*args, **kwargs)`"""
+        return self.update(loader(*args, **kwargs))
+
+
+def _unless_frozen(method: Callable) -> Callable:
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._frozen:
+            raise TypeError("Config snapshots are read only")
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class CachedParser(object):
+    """Parser reusing the contents of files that didn't change
+
+    Files are parsed again only when their modification time, size or inode
+    change. Parsed contents are shared between loads and must not be modified.
+
+    :param parser: Parse function(path, format=None) to cache
+    """
+
+    def __init__(self, parser: Optional[TParser] = None):
+        self._parser: TParser = parse if parser is None else parser  # type: ignore
+        self._cache: Dict[Tuple[str, Optional[str]], Tuple[Any, TConfigurationData]] = {}
+
+    def __call__(self, path: str, format: Optional[str] = None) -> TConfigurationData:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self._parser(path, format)
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        cached = self._cache.get((path, format))
+        hit = cached is not None and cached[0] == signature
+        if metrics.enabled:
+            metrics.cache("parser", hit)
+        if hit:
+            return cached[1]  # type: ignore
+        config = self._parser(path, format)
+        self._cache[path, format] = signature, config
+        return config
+
+
+def watch(
+    loader: TLoader, *args, interval: float = 1.0, **kwargs
+) -> Iterator[Tuple[TConfigurationData, List[TChange]]]:
+    """Load config every interval seconds yielding it when it changes
+
+    Loads use a CachedParser, so only changed files are parsed again. Errors
+    are logged and the config is loaded again on the next interval.
+
+    :param loader: Loader function, called as `loader(*args, **kwargs)`
+    :param interval: Seconds to wait between loads
+    :returns: Iterator of (config, changes) where changes are given as in
+              `changes`, the first iteration gives all the values as added
+    """
+    kwargs.setdefault("parser", CachedParser())
+    config: TConfigurationData = OrderedDict()
+    first = True
+    while True:
+        try:
+            new_config = loader(*args, **kwargs)
+        except Exception as error:
+            logger.error("Error reloading config: %s", error)
+        else:
+            found = list(changes(config, new_config))
+            if found or first:
+                yield new_config, found
+            config, first = new_config, False
+        time.sleep(interval)
+
+
+class FrozenConfig(OrderedDict):
+    """Read only OrderedDict used for published config snapshots
+
+    Instances made by `freeze` can't be modified, while new instances and
+    copies are regular, modifiable, OrderedDicts.
+    """
+
+    _frozen = False
+
+    __setitem__ = _unless_frozen(OrderedDict.__setitem__)
+    __delitem__ = _unless_frozen(OrderedDict.__delitem__)
+    clear = _unless_frozen(OrderedDict.clear)
+    pop = _unless_frozen(OrderedDict.pop)
+    popitem = _unless_frozen(OrderedDict.popitem)
+    setdefault = _unless_frozen(OrderedDict.setdefault)
+    update = _unless_frozen(OrderedDict.update)
+    move_to_end = _unless_frozen(OrderedDict.move_to_end)
+    if hasattr(OrderedDict, "__ior__"):  # Python 3.9+
+        __ior__ = _unless_frozen(OrderedDict.__ior__)
+
+    def __reduce__(self):
+        return self.__class__, (), None, None, iter(self.items())
+
+
+class FrozenConfigIndex(ConfigIndex, FrozenConfig):
+    """Read only ConfigIndex, made by `freeze` for indexed configs
+
+    Copies are regular ConfigIndex instances.
+    """
+
+    def __reduce__(self):
+        return ConfigIndex, (OrderedDict(self.items()),)
+
+
+class FrozenList(list):
+    """Read only list used for published config snapshots
+
+    See `FrozenConfig`.
+    """
+
+    _frozen = False
+
+    __setitem__ = _unless_frozen(list.__setitem__)
+    __delitem__ = _unless_frozen(list.__delitem__)
+    __iadd__ = _unless_frozen(list.__iadd__)
+    __imul__ = _unless_frozen(list.__imul__)
+    append = _unless_frozen(list.append)
+    clear = _unless_frozen(list.clear)
+    extend = _unless_frozen(list.extend)
+    insert = _unless_frozen(list.insert)
+    pop = _unless_frozen(list.pop)
+    remove = _unless_frozen(list.remove)
+    reverse = _unless_frozen(list.reverse)
+    sort = _unless_frozen(list.sort)
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+
+def freeze(config: Any) -> Any:
+    """Return a read only copy of a config
+
+    Sections are copied as FrozenConfig, lists as FrozenList and indexed
+    configs as FrozenConfigIndex, keeping their dotted key path lookups.
+    """
+    if isinstance(config, (FrozenConfig, FrozenList)) and config._frozen:
+        return config
+    elif isinstance(config, ConfigIndex):
+        index = FrozenConfigIndex(
+            OrderedDict((key, freeze(value)) for key, value in config.items())
+        )
+        index._frozen = True
+        return index
+    elif isinstance(config, _SECTIONS):
+        frozen = FrozenConfig((key, freeze(value)) for key, value in config.items())
+        frozen._frozen = True
+        return frozen
+    elif isinstance(config, list):
+        frozen_list = FrozenList(freeze(item) for item in config)
+        frozen_list._frozen = True
+        return frozen_list
+    return config
+
+
+class ConfigHolder(object):
+    """Hold the current config of an application for concurrent readers
+
+    Each load publishes a new read only snapshot by swapping a reference, so
+    reading the config never takes a lock. Reloads are single flight: calls
+    made while a reload is running wait for it and then share the result of
+    a single new load, as the running one may have read the config before
+    the changes the calls were made for.
+
+        holder = ConfigHolder(load_app, "myapp")
+        holder.config["db"]["host"]
+        holder.reload()
+
+    :param loader: Loader function returning the config
+    :param args: Positional arguments for the loader
+    :param kwargs: Keyword arguments for the loader
+    """
+
+    def __init__(self, loader: TLoader, *args, **kwargs):
+        self._load = functools.partial(loader, *args, **kwargs)
+        self._lock = threading.Lock()
+        self._snapshot: Optional[TConfigurationData] = None
+        self._generation = 0
+        self._started = 0  # Number of loads started
+        self._loaded = 0  # Number of the load of the published snapshot
+
+    @property
+    def config(self) -> TConfigurationData:
+        """Last published snapshot, loaded on first access"""
+        snapshot = self._snapshot
+        return self.reload() if snapshot is None else snapshot
+
+    @property
+    def generation(self) -> int:
+        """Number of snapshots published so far"""
+        return self._generation
+
+    def reload(self) -> TConfigurationData:
+        """Load the config and publish it as the new snapshot
+
+        :returns: The published snapshot
+        """
+        started = self._started
+        with self._lock:
+            # Share the snapshot only of a load started after this call
+            if self._loaded > started and self._snapshot is not None:
+                return self._snapshot
+            self._started += 1
+            number = self._started
+            start = time.perf_counter() if metrics.enabled else 0.0
+            snapshot = freeze(self._load())
+            if metrics.enabled:
+                metrics.observe("reload_duration_seconds", time.perf_counter() - start)
+            self._snapshot, self._loaded = snapshot, number
+            self._generation += 1
+            return snapshot
+
+
+class Metrics(object):
+    """Cumulative counters and histograms of config loading
+
+    Nothing is recorded until enabled, so disabled metrics cost a single
+    attribute check. Values are exported in the Prometheus text format:
+
+        confight.metrics.enabled = True
+        config = confight.load_app("myapp")
+        print(confight.metrics.export())
+
+    Cache hits and misses are counted for each cache: `parser` for
+    `CachedParser`, `http` for conditional requests of `HttpSource`,
+    `layer_store` for `LayerStore` syncs and `bundle` for opened bundles.
+    Loads made only to list the files of an application, as done by
+    `load_apps` or `get_value`, are not recorded.
+    """
+
+    COUNTERS: Dict[str, str] = OrderedDict(
+        [
+            ("loads", "Configs loaded by load calls"),
+            ("apps_loaded", "Configs of applications loaded by load_apps calls"),
+            ("files_parsed", "Config files parsed"),
+            ("files_skipped", "Config files not parsed again as unchanged"),
+            ("bytes_read", "Bytes of config files parsed"),
+            ("cache_hits", "Cache lookups finding a valid entry, by cache"),
+            ("cache_misses", "Cache lookups finding no valid entry, by cache"),
+        ]
+    )
+    HISTOGRAMS: Dict[str, str] = OrderedDict(
+        [
+            ("load_duration_seconds", "Time taken by each load call"),
+            ("batch_load_duration_seconds", "Time taken by each load_apps call"),
+            ("reload_duration_seconds", "Time taken by each ConfigHolder reload"),
+        ]
+    )
+    BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all the metrics back to zero"""
+        with self._lock:
+            self._counters: Dict[str, Dict[str, float]] = {name: {} for name in self.COUNTERS}
+            self._histograms: Dict[str, List[float]] = {
+                name: [0] * (len(self.BUCKETS) + 3) for name in self.HISTOGRAMS
+            }
+
+    def inc(self, name: str, amount: int = 1, cache: str = "") -> None:
+        """Add amount to a counter"""
+        if _discovering.get():
+            return
+        with self._lock:
+            counter = self._counters[name]
+            counter[cache] = counter.get(cache, 0) + amount
+
+    def cache(self, cache: str, hit: bool) -> None:
+        """Count a lookup in a cache, hits also count as skipped files"""
+        if hit and cache != "bundle":
+            self.inc("files_skipped")
+        self.inc("cache_hits" if hit else "cache_misses", cache=cache)
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record a duration in a histogram"""
+        if _discovering.get():
+            return
+        with self._lock:
+            histogram = self._histograms[name]
+            for position, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[position] += 1
+            histogram[-3] += 1  # +Inf bucket
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def get(self, name: str, cache: str = "") -> float:
+        """Return the value of a counter"""
+        return self._counters[name].get(cache, 0)
+
+    def hit_ratio(self, cache: str) -> Optional[float]:
+        """Return the ratio of hits of a cache, None if never used"""
+        hits, misses = self.get("cache_hits", cache), self.get("cache_misses", cache)
+        return hits / (hits + misses) if hits + misses else None
+
+    def histogram(self, name: str) -> Dict[str, Any]:
+        """Return the cumulative bucket counts, sum and count of a histogram"""
+        with self._lock:
+            histogram = list(self._histograms[name])
+        bounds = [str(bound) for bound in self.BUCKETS] + ["+Inf"]
+        return {
+            "buckets": OrderedDict(zip(bounds, histogram[:-2])),
+            "sum": histogram[-2],
+            "count": histogram[-1],
+        }
+
+    def export(self) -> str:
+        """Return all the metrics in the Prometheus text format"""
+        lines = []
+        for name, description in self.COUNTERS.items():
+            full_name = "confight_{}_total".format(name)
+            lines += [
+                "# HELP {} {}".format(full_name, description),
+                "# TYPE {} counter".format(full_name),
+            ]
+            with self._lock:
+                values = sorted(self._counters[name].items())
+            if name.startswith("cache_"):
+                for cache, value in values:
+                    lines.append('{}{{cache="{}"}} {}'.format(full_name, cache, value))
+            else:
+                lines.append("{} {}".format(full_name, dict(values).get("", 0)))
+        for name, description in self.HISTOGRAMS.items():
+            full_name = "confight_" + name
+            lines += [
+                "# HELP {} {}".format(full_name, description),
+                "# TYPE {} histogram".format(full_name),
+            ]
+            histogram = self.histogram(name)
+            for bound, count in histogram["buckets"].items():
+                lines.append('{}_bucket{{le="{}"}} {}'.format(full_name, bound, count))
+            lines.append("{}_sum {!r}".format(full_name, float(histogram["sum"])))
+            lines.append("{}_count {}".format(full_name, histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+
+metrics: Metrics = Metrics()
+
+
+def memory_stats(loader: TLoader, *args, **kwargs) -> Dict[str, Any]:
+    """Measure the memory allocated to load a config
+
+    The finding, the parsing of each file and the merging steps are measured
+    separately with `tracemalloc`, started and stopped for the measure. It
+    can't be used while `tracemalloc` is already tracing, as measuring each
+    step clears the traces. Retained memory is the memory allocated by each
+    step still in use after it.
+
+        memory_stats(load_app, "myapp")
+
+    :param loader: Loader function, called as `loader(*args, **kwargs)`
+    :returns: dict with `peak` and `retained` bytes for `discovery`, each of
+              the `layers` and `merge`, and the size of each top level key of
+              the merged config in `keys`
+    :raises RuntimeError: When tracemalloc is already tracing
+    """
+    the_parser: TParser = kwargs.pop("parser", None) or parse  # type: ignore
+    the_merger: TMerger = kwargs.pop("merger", None) or merge
+    if tracemalloc.is_tracing():
+        raise RuntimeError("Can't measure memory while tracemalloc is already tracing")
+    tracemalloc.start()
+    try:
+        files, discovery = _measure(_discover, loader, *args, **kwargs)
+        layers, stats = [], []
+        for path, format in files:
+            layer, layer_stats = _measure(the_parser, path, format)
+            layers.append(layer)
+            stats.append(OrderedDict(path=path, **layer_stats))
+        config, merge_stats = _measure(the_merger, layers)
+    finally:
+        tracemalloc.stop()
+    discovery["files"] = len(files)
+    return OrderedDict(
+        discovery=discovery,
+        layers=stats,
+        merge=merge_stats,
+        keys=OrderedDict((key, deep_sizeof(value)) for key, value in config.items()),
+    )
+
+
+def _measure(function: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, int]]:
+    """Call function returning its result and its peak and retained memory"""
+    tracemalloc.clear_traces()
+    result = function(*args, **kwargs)
+    retained, peak = tracemalloc.get_traced_memory()
+    return result, OrderedDict(peak=peak, retained=retained)
+
+
+def deep_sizeof(value: Any, seen: Optional[Set[int]] = None) -> int:
+    """Return the size in bytes of a config value including its contents
+
+    Objects referenced several times are counted once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(deep_sizeof(item, seen) for item in value)
+    return size
+
+
+class LayerStore(object):
+    """Store parsed config files in a SQLite database for key path queries
+
+    Every parsed file is a layer whose values are stored by key path, so the
+    effective value of a key path, or of a whole section, is resolved with a
+    single indexed query following the same rules as `merge`, without loading
+    the whole config in memory. Syncing only parses the files that changed.
+
+        store = LayerStore("/var/cache/myapp/config.db")
+        store.sync_app("myapp")
+        store.get("db.pool.size", 10)
+
+    Values are stored as JSON, other types such as dates are stored as their
+    string representation.
+
+    :param database: Path to the SQLite database file
+    """
+
+    SEPARATOR = "\x1f"
+
+    def __init__(self, database: str):
+        self.database = database
+        self._db = sqlite3.connect(database)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS layers (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                position INTEGER NOT NULL,
+                signature TEXT
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                layer_id INTEGER NOT NULL,
+                key_path TEXT NOT NULL,
+                sequence INTEGER NOT NULL,
+                is_section INTEGER NOT NULL,
+                value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS entries_by_key_path ON entries (key_path);
+            CREATE INDEX IF NOT EXISTS entries_by_layer ON entries (layer_id);
+            """
+        )
+
+    def sync(self, paths: List[str], **kwargs) -> List[str]:
+        """Store the layers of the files found in paths, in order
+
+        Accepts the same arguments as `load_paths`. Files already stored are
+        parsed again only if changed and files no longer found are removed.
+
+        :returns: List of the files parsed
+        """
+        return self._sync(load_paths, paths, **kwargs)
+
+    def sync_app(self, name: str, loader: Optional[TLoader] = None, **kwargs) -> List[str]:
+        """Store the layers of an application, see `sync`
+
+        :param name: Name of the application
+        :param loader: Loader function(name, **kwargs) to find the files with,
+                       defaults to `load_app`
+        """
+        return self._sync(load_app if loader is None else loader, name, **kwargs)
+
+    def _sync(self, loader: TLoader, *args, **kwargs) -> List[str]:
+        the_parser: TParser = kwargs.pop("parser", None) or parse  # type: ignore
+        planned = OrderedDict(_discover(loader, *args, **kwargs))
+        known = {
+            path: (layer_id, signature)
+            for layer_id, path, signature in self._db.execute(
+                "SELECT id, path, signature FROM layers"
+            )
+        }
+        parsed = []
+        with self._db:
+            for path in set(known) - set(planned):
+                self._delete(known[path][0])
+            for position, (path, format) in enumerate(planned.items()):
+                signature = _file_signature(path)
+                layer_id, known_signature = known.get(path, (None, None))
+                unchanged = (
+                    layer_id is not None and bool(signature) and signature == known_signature
+                )
+                if metrics.enabled:
+                    metrics.cache("layer_store", unchanged)
+                if unchanged:
+                    self._db.execute(
+                        "UPDATE layers SET position = ? WHERE id = ?", (position, layer_id)
+                    )
+                    continue
+                config = the_parser(path, format)
+                if layer_id is not None:
+                    self._delete(layer_id)
+                cursor = self._db.execute(
+                    "INSERT INTO layers (path, position, signature) VALUES (?, ?, ?)",
+                    (path, position, signature),
+                )
+                self._db.executemany(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (cursor.lastrowid, self.SEPARATOR.join(key_path), sequence) + row
+                        for sequence, (key_path, row) in enumerate(self._entries(config, ()))
+                    ),
+                )
+                parsed.append(path)
+        return parsed
+
+    def _entries(
+        self, config: TConfigurationData, path: Tuple[str, ...]
+    ) -> Iterator[Tuple[Tuple[str, ...], Tuple[int, Optional[str]]]]:
+        for key, value in config.items():
+            if isinstance(value, dict):
+                yield path + (str(key),), (1, None)
+                yield from self._entries(value, path + (str(key),))
+            else:
+                yield path + (str(key),), (0, json.dumps(value, default=str))
+
+    def _delete(self, layer_id: int) -> None:
+        self._db.execute("DELETE FROM entries WHERE layer_id = ?", (layer_id,))
+        self._db.execute("DELETE FROM layers WHERE id = ?", (layer_id,))
+
+    def get(self, path: TKeyPath, default: Any = None) -> Any:
+        """Return the effective value at a key path or default if missing"""
+        keys = key_path(path)
+        row = self._db.execute(
+            """
+            SELECT entries.is_section, entries.value
+            FROM entries JOIN layers ON layers.id = entries.layer_id
+            WHERE entries.key_path = ?
+            ORDER BY entries.is_section DESC, layers.position DESC
+            LIMIT 1
+            """,
+            (self.SEPARATOR.join(keys),),
+        ).fetchone()
+        if row is None:
+            return default
+        is_section, value = row
+        return self.section(keys) if is_section else self._load_value(value)
+
+    def section(self, path: TKeyPath = ()) -> TConfigurationData:
+        """Return the effective config under a key path
+
+        :param path: Key path of the section, the whole config by default
+        :returns: dict with the merged section, empty if missing
+        """
+        keys = key_path(path)
+        query = """
+            SELECT layers.position, entries.key_path, entries.is_section, entries.value
+            FROM entries JOIN layers ON layers.id = entries.layer_id
+        """
+        params: Tuple[str, ...] = ()
+        if keys:
+            prefix = self.SEPARATOR.join(keys)
+            query += "WHERE entries.key_path >= ? AND entries.key_path < ?"
+            params = (prefix, prefix + chr(ord(self.SEPARATOR) + 1))
+        query += "ORDER BY layers.position, entries.sequence"
+        layers: Dict[int, TConfigurationData] = OrderedDict()
+        for position, row_path, is_section, value in self._db.execute(query, params):
+            row_keys = tuple(row_path.split(self.SEPARATOR))[len(keys) :]
+            if not row_keys:
+                # The section itself, ignored for layers where it's not a dict
+                if is_section:
+                    layers[position] = OrderedDict()
+                continue
+            section = _lookup(layers.setdefault(position, OrderedDict()), row_keys[:-1])
+            section[row_keys[-1]] = OrderedDict() if is_section else self._load_value(value)
+        return merge(list(layers.values()))
+
+    def _load_value(self, value: str) -> Any:
+        return json.loads(value, object_pairs_hook=OrderedDict)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _file_signature(path: str) -> Optional[str]:
+    """Return a string changing when the file at path is modified"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return "{}:{}:{}".format(stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
 def find(path: str) -> List[str]:
     """Find files in the filesystem in order
 
@@ -183,11 +1765,15 @@ def find(path: str) -> List[str]:
     :param dir_path: Path to a config file or dir containing configs
     :returns: List of full paths of the files in the directory in lex. order
     """
+    if is_url(path):
+        return [path]
     if path:
         path = os.path.abspath(os.path.expanduser(path))
     if not check_access(path):
         return []
     if os.path.isfile(path):
+        if is_bundle(path):
+            return [os.path.join(path, name) for name in _open_bundle(path).names()]
         return [path]
     return sorted(glob.glob(os.path.join(path, "*")))
 
@@ -210,10 +1796,257 @@ def check_access(path: str) -> bool:
     return True
 
 
+def is_url(path: Optional[str]) -> bool:
+    """Return whether a path is an HTTP(S) URL"""
+    return path is not None and path.startswith(("http://", "https://"))
+
+
+class HttpSource(object):
+    """Fetch and parse configs served over HTTP(S)
+
+    Connections are kept open and reused for each host. Documents served with
+    an `ETag` or `Last-Modified` header are cached, so fetching them again is a
+    conditional request answered with a 304 when unchanged, without parsing.
+    Cached configs are shared between loads and must not be modified.
+
+    :param timeout: Timeout in seconds of each connection
+    :param max_workers: Maximum number of URLs fetched concurrently
+    """
+
+    def __init__(self, timeout: float = 10.0, max_workers: int = 8):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._connections: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._cache: Dict[Tuple[str, str], Tuple[Dict[str, str], TConfigurationData]] = {}
+
+    def parse(self, url: str, format: Optional[str] = None) -> TConfigurationData:
+        """Fetch and parse the config at the given URL
+
+        :param url: HTTP(S) URL of the config
+        :param format: Name of the format (default: guess from the URL path)
+        :returns: dict with the parsed contents
+        """
+        the_format: str = format_from_path(urlsplit(url).path) if format is None else format
+        if the_format not in FORMATS:
+            raise ValueError("Unknown format {} for file {}".format(the_format, url))
+        validators, cached = self._cache.get((url, the_format), ({}, None))
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last-modified" in validators:
+            headers["If-Modified-Since"] = validators["last-modified"]
+        status, response_headers, body = self._request(url, headers)
+        if status == 304 and cached is not None:
+            logger.info("Config from %r not modified", url)
+            if metrics.enabled:
+                metrics.cache("http", True)
+            return cached
+        if status != 200:
+            raise ValueError("Could not fetch {}: HTTP status {}".format(url, status))
+        if metrics.enabled:
+            metrics.cache("http", False)
+            metrics.inc("files_parsed")
+            metrics.inc("bytes_read", len(body))
+        logger.info("Parsing %r config file from %r", the_format, url)
+        loader: TFormatLoader = FORMAT_LOADERS[the_format]
+        config = loader(io.StringIO(body.decode("utf8")), the_format)
+        validators = {
+            name: response_headers[name]
+            for name in ("etag", "last-modified")
+            if name in response_headers
+        }
+        if validators:
+            self._cache[url, the_format] = validators, config
+        return config
+
+    def fetch_all(
+        self, urls: List[str], format: Optional[str] = None
+    ) -> Dict[str, TConfigurationData]:
+        """Fetch and parse several URLs concurrently
+
+        :returns: dict with the parsed contents of each URL
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(urls, executor.map(lambda url: self.parse(url, format), urls)))
+
+    def close(self) -> None:
+        """Close all the idle connections"""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for connection in itertools.chain.from_iterable(connections.values()):
+            connection.close()
+
+    def _request(self, url: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        parts = urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        key = (parts.scheme, parts.netloc)
+        connection, reused = self._acquire(key)
+        try:
+            try:
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                if not reused:
+                    raise
+                # Idle connection closed by the server, retry with a new one
+                connection.close()
+                connection, reused = self._new_connection(key), False
+                connection.request("GET", target, headers=headers)
+                response = connection.getresponse()
+            body = response.read()
+        except BaseException:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        return response.status, response_headers, body
+
+    def _acquire(self, key: Tuple[str, str]) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._connections.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(key), False
+
+    def _release(self, key: Tuple[str, str], connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._connections.setdefault(key, []).append(connection)
+
+    def _new_connection(self, key: Tuple[str, str]) -> http.client.HTTPConnection:
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+
+http_source: HttpSource = HttpSource()
+
+
+BUNDLE_EXTENSIONS: Set[str] = {"zip"}
+
+
+class Bundle(object):
+    """Read the config files packed in a bundle
+
+    Bundles are uncompressed zip files holding the files of a `conf.d`
+    directory in order, made with `pack`. Reading any number of files from a
+    bundle costs a single open of the bundle file.
+
+    :param path: Path to the bundle file
+    :param use_mmap: Memory map the bundle file instead of reading it
+    """
+
+    def __init__(self, path: str, use_mmap: bool = True):
+        self.path = path
+        with io.open(path, "rb") as stream:
+            data: Any = None
+            if use_mmap:
+                try:
+                    data = _MappedFile(stream.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:  # Empty files can't be mapped
+                    pass
+            if data is None:
+                data = io.BytesIO(stream.read())
+        self._zip = zipfile.ZipFile(data)
+
+    def names(self) -> List[str]:
+        """Return the names of the packed files in order"""
+        return self._zip.namelist()
+
+    def open(self, name: str) -> IO:
+        """Open a packed file as text"""
+        return io.TextIOWrapper(self._zip.open(name), encoding="utf8")
+
+    def size(self, name: str) -> int:
+        """Return the size in bytes of a packed file"""
+        return self._zip.getinfo(name).file_size
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class _MappedFile(mmap.mmap):
+    """Memory mapped file usable as a zipfile file object"""
+
+    def seekable(self) -> bool:
+        return True
+
+
+# Bundles already opened with their file signature
+_bundles: Dict[str, Tuple[Tuple[int, ...], Bundle]] = {}
+
+
+def is_bundle(path: str) -> bool:
+    """Return whether a path has the extension of a bundle"""
+    return os.path.splitext(path)[1][1:] in BUNDLE_EXTENSIONS
+
+
+def _open_bundle(path: str) -> Bundle:
+    """Return the Bundle at path, opening it again only if modified"""
+    info = os.stat(path)
+    signature = (info.st_mtime_ns, info.st_size, info.st_ino)
+    cached = _bundles.get(path)
+    hit = cached is not None and cached[0] == signature
+    if metrics.enabled:
+        metrics.cache("bundle", hit)
+    if cached is None or not hit:
+        cached = _bundles[path] = (signature, Bundle(path))
+    return cached[1]
+
+
+def _bundle_of(path: str) -> Optional[Bundle]:
+    """Return the Bundle holding the file at path, if any"""
+    bundle_path = os.path.dirname(path)
+    if not is_bundle(bundle_path):
+        return None
+    try:
+        if not stat.S_ISREG(os.stat(bundle_path).st_mode):
+            return None
+    except OSError:
+        return None
+    return _open_bundle(bundle_path)
+
+
+def pack(paths: List[str], bundle_path: str, **kwargs) -> List[str]:
+    """Pack the config files found in paths into a bundle
+
+    Files are found as in `load_paths`, accepting the same arguments, and
+    stored in order by their file name.
+
+    :param paths: List of files and directories to pack
+    :param bundle_path: Path of the bundle file to write
+    :returns: List of the packed files
+    """
+    files = [path for path, _ in _discover(load_paths, paths, **kwargs)]
+    names = [os.path.basename(path) for path in files]
+    if len(set(names)) != len(names):
+        raise ValueError("Can't pack several files with the same name in {}".format(bundle_path))
+    temporary_path = bundle_path + ".tmp"
+    with zipfile.ZipFile(temporary_path, "w", zipfile.ZIP_STORED) as bundle:
+        for path, name in zip(files, names):
+            bundle.write(path, name)
+    os.replace(temporary_path, bundle_path)
+    return files
+
+
 def load_json(stream: IO, format: Optional[str] = None) -> TConfigurationData:
     return json.load(stream, object_pairs_hook=OrderedDict)
 
 
+def _reduce_toml_tz(tz: TomlTz) -> Tuple[Any, ...]:
+    return TomlTz, (tz._raw_offset,)
+
+
+# Dates with timezones parsed from TOML can't be pickled otherwise
+copyreg.pickle(TomlTz, _reduce_toml_tz)
+
+
 def load_toml(stream: IO, format: Optional[str] = None) -> TConfigurationData:
     return toml.load(stream, _dict=OrderedDict)
 
@@ -292,12 +2125,134 @@ def cli_configure_logging(args):
     logger.addHandler(logging.StreamHandler())
 
 
+def cli_add_app_arguments(parser):
+    parser.add_argument("--prefix", help="Base for default paths")
+    parser.add_argument("--user-prefix", help="Base for default user paths")
+
+
 def cli_show(args):
-    """Load config and show it"""
-    config = load_user_app(args.name, prefix=args.prefix, user_prefix=args.user_prefix)
+    """Load config and show it
+
+    Several applications are shown each one as a table named after it.
+    """
+    options = dict(prefix=args.prefix, user_prefix=args.user_prefix)
+    if len(args.name) == 1:
+        config = load_user_app(args.name[0], **options)
+    else:
+        config = load_apps(args.name, loader=load_user_app, **options)
     print(toml.dumps(config), end="")
 
 
+def cli_show_watch(args):
+    """Show config changes as a stream of JSON lines"""
+    options = dict(prefix=args.prefix, user_prefix=args.user_prefix, interval=args.interval)
+    if len(args.name) == 1:
+        updates = watch(load_user_app, args.name[0], **options)
+    else:
+        updates = watch(load_apps, args.name, loader=load_user_app, **options)
+    try:
+        for _, found in updates:
+            for path, _, value in found:
+                event = {"path": list(path)}
+                if value is MISSING:
+                    event["removed"] = True
+                else:
+                    event["value"] = value
+                print(json.dumps(event, default=str), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def cli_stats(args):
+    """Load config and show the memory used for it"""
+    stats = memory_stats(load_user_app, args.name, prefix=args.prefix, user_prefix=args.user_prefix)
+    row = "{:<60} {:>12} {:>12}"
+    print(row.format("step", "peak", "retained"))
+    print(row.format("discovery", stats["discovery"]["peak"], stats["discovery"]["retained"]))
+    for layer in stats["layers"]:
+        print(row.format(layer["path"], layer["peak"], layer["retained"]))
+    print(row.format("merge", stats["merge"]["peak"], stats["merge"]["retained"]))
+    print()
+    print("{:<60} {:>12}".format("key", "size"))
+    for key, size in stats["keys"].items():
+        print("{:<60} {:>12}".format(key, size))
+
+
+def cli_get(args):
+    """Show a single value from the config"""
+    try:
+        value = get_value(
+            args.name,
+            args.key,
+            loader=load_user_app,
+            prefix=args.prefix,
+            user_prefix=args.user_prefix,
+        )
+    except KeyError as error:  # Its str() would quote the message
+        raise ValueError(error.args[0]) from None
+    if isinstance(value, dict):
+        print(toml.dumps(value), end="")
+    elif isinstance(value, str):
+        print(value)
+    else:
+        print(json.dumps(value, default=str))
+
+
+def cli_pack(args):
+    """Pack config files into a bundle"""
+    for path in pack(args.path, args.bundle):
+        logger.info("Packed %r", path)
+
+
+def cli_diff(args):
+    """Show the delta between two config files as JSON
+
+    Fails if the delta can't be applied once written as JSON.
+    """
+    old = parse(args.old)
+    try:
+        text = json.dumps(diff(old, parse(args.new)))
+        patch(old, json.loads(text, object_pairs_hook=OrderedDict))
+    except (TypeError, ValueError) as error:
+        raise ValueError("The delta can't be written as JSON: {}".format(error))
+    print(text)
+
+
+def cli_patch(args):
+    """Apply a JSON delta to a config file and show the result"""
+    with io.open(args.delta, encoding="utf8") as stream:
+        delta = json.load(stream, object_pairs_hook=OrderedDict)
+    print(toml.dumps(patch(parse(args.config), delta)), end="")
+
+
+def cli_digest(args):
+    """Load config and show its content digest"""
+    config = load_user_app(args.name, prefix=args.prefix, user_prefix=args.user_prefix)
+    print(digest(config))
+
+
+def cli_check(args):
+    """Check the config files of several applications, showing every error"""
+    errors = check_apps(
+        args.name,
+        loader=load_user_app,
+        max_workers=args.jobs,
+        prefix=args.prefix,
+        user_prefix=args.user_prefix,
+    )
+    for error in errors:
+        print(error)
+    if errors:
+        sys.exit(1)
+
+
+def cli_metrics(args):
+    """Load config with metrics enabled and show them"""
+    metrics.enabled = True
+    load_user_app(args.name, prefix=args.prefix, user_prefix=args.user_prefix)
+    print(metrics.export(), end="")
+
+
 def cli():
     LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
     parser = argparse.ArgumentParser(description="One simple way of parsing configs")
@@ -307,15 +2262,54 @@ def cli():
     )
     subparsers = parser.add_subparsers(title="subcommands", dest="command")
     show_parser = subparsers.add_parser("show")
-    show_parser.add_argument("name", help="Name of the application")
-    show_parser.add_argument("--prefix", help="Base for default paths")
-    show_parser.add_argument("--user-prefix", help="Base for default user paths")
+    show_parser.add_argument("name", nargs="+", help="Name of the applications")
+    cli_add_app_arguments(show_parser)
+    show_parser.add_argument(
+        "--watch", action="store_true", help="Keep running showing changes as JSON lines"
+    )
+    show_parser.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between checks for --watch"
+    )
+    get_parser = subparsers.add_parser("get")
+    get_parser.add_argument("name", help="Name of the application")
+    get_parser.add_argument("key", help="Dotted key path of the value, like db.pool.size")
+    cli_add_app_arguments(get_parser)
+    pack_parser = subparsers.add_parser("pack")
+    pack_parser.add_argument("bundle", help="Path of the bundle file to write, like conf.d.zip")
+    pack_parser.add_argument("path", nargs="+", help="Config files and directories to pack")
+    diff_parser = subparsers.add_parser("diff")
+    diff_parser.add_argument("old", help="Config file the delta applies to")
+    diff_parser.add_argument("new", help="Config file resulting from the delta")
+    patch_parser = subparsers.add_parser("patch")
+    patch_parser.add_argument("config", help="Config file to apply the delta to")
+    patch_parser.add_argument("delta", help="JSON file with the delta made by diff")
+    stats_parser = subparsers.add_parser("stats")
+    stats_parser.add_argument("name", help="Name of the application")
+    cli_add_app_arguments(stats_parser)
+    metrics_parser = subparsers.add_parser("metrics")
+    metrics_parser.add_argument("name", help="Name of the application")
+    cli_add_app_arguments(metrics_parser)
+    check_parser = subparsers.add_parser("check")
+    check_parser.add_argument("name", nargs="+", help="Name of the applications")
+    cli_add_app_arguments(check_parser)
+    check_parser.add_argument("-j", "--jobs", type=int, help="Number of parsing processes")
+    digest_parser = subparsers.add_parser("digest")
+    digest_parser.add_argument("name", help="Name of the application")
+    cli_add_app_arguments(digest_parser)
 
     args = parser.parse_args()
     cli_configure_logging(args)
     # Use callbacks, parser.set_defaults(func=) does not work in Python3.3
     callbacks = {
-        "show": cli_show,
+        "show": lambda args: cli_show_watch(args) if args.watch else cli_show(args),
+        "digest": cli_digest,
+        "check": cli_check,
+        "metrics": cli_metrics,
+        "stats": cli_stats,
+        "get": cli_get,
+        "pack": cli_pack,
+        "diff": cli_diff,
+        "patch": cli_patch,
         None: lambda args: parser.print_help(file=sys.stderr),
     }
     try:
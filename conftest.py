@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Show the total time of each pipeline of test_equivalence.py"""
+    totals = defaultdict(float)
+    for reports in terminalreporter.stats.values():
+        for report in reports:
+            if getattr(report, "when", None) != "teardown":
+                continue
+            for name, value in report.user_properties:
+                if name == "timings":
+                    for pipeline, seconds in value.items():
+                        totals[pipeline] += seconds
+    if not totals:
+        return
+    terminalreporter.write_sep("=", "pipeline timings")
+    width = max(len(pipeline) for pipeline in totals)
+    for pipeline, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        terminalreporter.write_line("{:<{}}  {:9.4f}s".format(pipeline, width, seconds))
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
+import timeit
+from collections import OrderedDict
 try:
     import subprocess32 as subprocess
 except ImportError:
@@ -11,10 +14,19 @@ except ImportError:
 
 import pytest
 from hamcrest import (assert_that, has_entry, has_key, has_entries, is_, empty,
-                      only_contains, contains_exactly, contains_string)
+                      only_contains, contains_exactly, contains_string,
+                      contains_inanyorder, not_, has_length, greater_than,
+                      less_than, same_instance, has_item, has_properties,
+                      starts_with)
 
 from confight import (parse, merge, find, load, load_paths, load_app,
-                      load_user_app, FORMATS)
+                      load_user_app, load_apps, changes, Subscriptions,
+                      MISSING, digest, digest_tree, freeze, ConfigHolder,
+                      ConfigIndex, Schema, coerce_duration, HttpSource,
+                      LoadTimeout, CachedParser, watch, LayerStore,
+                      memory_stats, deep_sizeof, get_value, pack, Bundle,
+                      diff, patch, Overlay, load_overlay, check_apps,
+                      CheckError, Metrics, metrics, FORMATS)
 
 
 @pytest.fixture
@@ -22,6 +34,22 @@ def examples(tmpdir):
     return Repository(tmpdir)
 
 
+@pytest.fixture
+def server():
+    server = ConfigServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enabled = True
+    yield metrics
+    metrics.enabled = False
+    metrics.reset()
+
+
 FILES = [
     'basic_file.toml', 'basic_file.ini', 'basic_file.json', 'basic_file.cfg',
     'basic_file.js'
@@ -135,6 +163,824 @@ class TestMerge(object):
         assert_that(result, has_entry('section', has_entry('key', 3)))
 
 
+class TestChanges(object):
+    def test_it_should_report_nothing_for_equal_configs(self):
+        old = {'section': {'key': 1, 'list': [1, 2]}}
+        new = {'section': {'key': 1, 'list': [1, 2]}}
+
+        assert_that(list(changes(old, new)), is_(empty()))
+
+    def test_it_should_report_innermost_changed_keys(self):
+        old = {'section': {'sub': {'key': 1, 'other': 2}}}
+        new = {'section': {'sub': {'key': 3, 'other': 2}}}
+
+        assert_that(list(changes(old, new)), contains_exactly(
+            (('section', 'sub', 'key'), 1, 3),
+        ))
+
+    def test_it_should_report_added_and_removed_keys(self):
+        old = {'removed': 1, 'kept': 2}
+        new = {'kept': 2, 'added': 3}
+
+        assert_that(list(changes(old, new)), contains_exactly(
+            (('removed',), 1, MISSING),
+            (('added',), MISSING, 3),
+        ))
+
+    def test_it_should_compare_types(self):
+        old = {'key': 1}
+        new = {'key': True}
+
+        assert_that(list(changes(old, new)), contains_exactly(
+            (('key',), 1, True),
+        ))
+
+
+class TestDiff(object):
+    def test_it_should_only_hold_changes(self):
+        old = {'a': {'b': 1, 'c': 2}, 'd': 3}
+        new = {'a': {'b': 1, 'c': 20}, 'd': 3}
+
+        delta = diff(old, new)
+
+        assert_that(delta['changes'], contains_exactly(
+            ['set', ['a', 'c'], 20],
+        ))
+
+    def test_it_should_be_empty_for_equal_configs(self):
+        delta = diff({'a': {'b': [1]}}, {'a': {'b': [1]}})
+
+        assert_that(delta['changes'], is_(empty()))
+        assert_that(delta['base'], is_(delta['result']))
+
+    @pytest.mark.parametrize("old, new", [
+        ({'a': 1}, {'a': 2, 'b': {'c': 3}}),
+        ({'a': 1, 'b': 2}, {'b': 2}),
+        ({'a': {'b': 1}}, {'a': 1}),
+        ({'a': 1}, {'a': {'b': 1}}),
+        ({'a': 1, 'b': 2}, {'b': 2, 'a': 1}),
+        ({'s': {'a': 1, 'b': 2, 'c': 3}}, {'s': {'c': 3, 'd': 4, 'a': 1}}),
+        ({'a': 1}, {'a': True}),
+    ])
+    def test_patch_should_reproduce_new_config(self, old, new):
+        import json
+        old, new = OrderedDict(old), OrderedDict(new)
+        delta = json.loads(json.dumps(diff(old, new)))
+
+        result = patch(old, delta)
+
+        assert_that(result, is_(new))
+        assert_that(json.dumps(result), is_(json.dumps(new)))
+
+    def test_patch_should_not_modify_given_config(self):
+        old = {'a': {'b': 1}}
+
+        patch(old, diff(old, {'a': {'b': 2}}))
+
+        assert_that(old, is_({'a': {'b': 1}}))
+
+    def test_patch_should_fail_for_other_configs(self):
+        delta = diff({'a': 1}, {'a': 2})
+
+        with pytest.raises(ValueError):
+            patch({'a': 3}, delta)
+
+    def test_patch_should_fail_for_wrong_results(self):
+        delta = diff({'a': 1}, {'a': 2})
+        delta['changes'][0][2] = '2'
+
+        with pytest.raises(ValueError):
+            patch({'a': 1}, delta)
+
+
+class TestSubscriptions(object):
+    def test_it_should_notify_changed_subtrees(self):
+        calls = []
+        subscriptions = Subscriptions({'db': {'pool': {'size': 1}}})
+        subscriptions.subscribe('db.pool', lambda *args: calls.append(args))
+
+        subscriptions.update({'db': {'pool': {'size': 2}}})
+
+        assert_that(calls, contains_exactly(
+            ({'size': 1}, {'size': 2}),
+        ))
+
+    def test_it_should_not_notify_unchanged_subtrees(self):
+        calls = []
+        subscriptions = Subscriptions({'db': {'pool': 1}, 'web': {'port': 80}})
+        subscriptions.subscribe('db', lambda *args: calls.append(args))
+
+        changed = subscriptions.update({'db': {'pool': 1}, 'web': {'port': 8080}})
+
+        assert_that(calls, is_(empty()))
+        assert_that(changed, is_(empty()))
+
+    def test_it_should_notify_added_and_removed_paths(self):
+        calls = []
+        subscriptions = Subscriptions({})
+        subscriptions.subscribe(['db', 'host'], lambda *args: calls.append(args))
+
+        subscriptions.update({'db': {'host': 'localhost'}})
+        subscriptions.update({})
+
+        assert_that(calls, contains_exactly(
+            (MISSING, 'localhost'),
+            ('localhost', MISSING),
+        ))
+
+    def test_it_should_stop_notifying_unsubscribed_callbacks(self):
+        calls = []
+        subscriptions = Subscriptions({'key': 1})
+        subscriptions.subscribe('key', calls.append)
+        subscriptions.unsubscribe('key', calls.append)
+
+        subscriptions.update({'key': 2})
+
+        assert_that(calls, is_(empty()))
+
+    def test_it_should_reload_with_given_loader(self, examples):
+        calls = []
+        subscriptions = Subscriptions()
+        subscriptions.subscribe('section.key', lambda *args: calls.append(args))
+
+        subscriptions.reload(load, [examples.get('00_base.toml')])
+
+        assert_that(calls, contains_exactly((MISSING, 'zero')))
+
+
+class TestDigest(object):
+    def test_it_should_ignore_key_order(self):
+        first = {'a': 1, 'b': {'c': 2, 'd': 3}}
+        second = {'b': {'d': 3, 'c': 2}, 'a': 1}
+
+        assert_that(digest(first), is_(digest(second)))
+
+    @pytest.mark.parametrize("value, other", [
+        (1, True),
+        (1, 1.0),
+        (1, '1'),
+        (None, 'None'),
+        ([1, 2], [2, 1]),
+        ({'a': 1}, [('a', 1)]),
+    ])
+    def test_it_should_take_types_into_account(self, value, other):
+        assert_that(digest({'key': value}), is_(not_(digest({'key': other}))))
+
+    def test_it_should_match_across_formats(self, examples):
+        toml_config = parse(examples.get('00_base.toml'))
+        json_config = {'section': {'key': 'zero'}}
+
+        assert_that(digest(toml_config), is_(digest(json_config)))
+
+    def test_it_should_reuse_digests_of_unchanged_values(self):
+        shared = {'key': 'value'}
+        previous = digest_tree({'shared': shared, 'other': 1})
+
+        tree = digest_tree({'shared': shared, 'other': 2}, previous)
+
+        assert_that(tree.children['shared'], is_(previous.children['shared']))
+        assert_that(tree.digest, is_(digest_tree({'shared': shared, 'other': 2}).digest))
+
+    def test_it_should_not_hash_unchanged_reloads_again(self, examples, monkeypatch):
+        path = examples.create('config.toml', b'[a]\nx = 1\nl = [1, 2]\n[b]\ny = "z"')
+        previous = digest_tree(load_paths([path]))
+        hashes = self.count_hashes(monkeypatch)
+
+        tree = digest_tree(load_paths([path]), previous)
+
+        assert_that(tree.digest, is_(previous.digest))
+        assert_that(hashes, is_(empty()))
+
+    def test_it_should_only_hash_changed_subtrees(self, examples, monkeypatch):
+        path = examples.create('config.toml', b'[a]\nx = 1\nl = [1, 2]\n[b]\ny = "z"')
+        previous = digest_tree(load_paths([path]))
+        examples.create('config.toml', b'[a]\nx = 1\nl = [1, 2]\n[b]\ny = "w"')
+        new_config = load_paths([path])
+        hashes = self.count_hashes(monkeypatch)
+
+        tree = digest_tree(new_config, previous)
+
+        # The new value, its entry and section, the root entry and the root
+        assert_that(hashes, has_length(5))
+        assert_that(tree.digest, is_(digest_tree(new_config).digest))
+
+    @pytest.mark.parametrize("value, other", [
+        (0.0, -0.0),
+        (1, True),
+        ([1, {'a': 1}], [1, {'a': 2}]),
+        ({'a': 1}, [('a', 1)]),
+    ])
+    def test_it_should_hash_changed_values_of_previous_trees(self, value, other):
+        previous = digest_tree({'key': value})
+
+        tree = digest_tree({'key': other}, previous)
+
+        assert_that(tree.digest, is_(digest_tree({'key': other}).digest))
+        assert_that(tree.digest, is_(not_(previous.digest)))
+
+    def count_hashes(self, monkeypatch):
+        import confight
+        hashes = []
+        original = confight._hash
+
+        def counting_hash(tag, *parts):
+            hashes.append(tag)
+            return original(tag, *parts)
+        monkeypatch.setattr(confight, '_hash', counting_hash)
+        return hashes
+
+    def test_it_should_list_changed_paths(self):
+        old = digest_tree({'a': {'b': 1, 'c': 2}, 'd': 3, 'e': 4})
+        new = digest_tree({'a': {'b': 1, 'c': 5}, 'd': 3, 'f': 6})
+
+        assert_that(list(old.changed(new)), contains_inanyorder(
+            ('a', 'c'), ('e',), ('f',)
+        ))
+
+
+class TestCachedParser(object):
+    def test_it_should_not_parse_unchanged_files_again(self, examples):
+        path = examples.get('00_base.toml')
+        myparser = mock.Mock(side_effect=parse)
+        parser = CachedParser(myparser)
+
+        first = parser(path)
+        second = parser(path)
+
+        assert_that(second, is_(first))
+        assert_that(myparser.call_count, is_(1))
+
+    def test_it_should_parse_changed_files(self, examples):
+        path = examples.create('changing.toml', b'key = 1')
+        parser = CachedParser()
+        parser(path)
+        examples.create('changing.toml', b'key = 22')
+
+        assert_that(parser(path), has_entry('key', 22))
+
+
+class TestWatch(object):
+    def test_it_should_give_whole_config_first(self, examples):
+        path = examples.create('watched.toml', b'[section]\nkey = 1')
+
+        config, found = next(watch(load, [path], interval=0))
+
+        assert_that(config, has_entry('section', has_entry('key', 1)))
+        assert_that(found, contains_exactly(
+            (('section',), MISSING, {'key': 1}),
+        ))
+
+    def test_it_should_give_only_changes(self, examples):
+        path = examples.create('watched.toml', b'[section]\nkey = 1\nother = 2')
+        updates = watch(load, [path], interval=0)
+        next(updates)
+        examples.create('watched.toml', b'[section]\nkey = 10\nother = 2')
+
+        config, found = next(updates)
+
+        assert_that(found, contains_exactly(
+            (('section', 'key'), 1, 10),
+        ))
+
+    @mock.patch('confight.logger')
+    def test_it_should_keep_watching_after_errors(self, logger, examples):
+        path = examples.create('watched.toml', b'key = 1')
+        updates = watch(load, [path], interval=0)
+        next(updates)
+        examples.create('watched.toml', b'[broken')
+        calls = []
+
+        def fix(*args):
+            calls.append(args)
+            examples.create('watched.toml', b'key = 2')
+        logger.error.side_effect = fix
+
+        config, found = next(updates)
+
+        assert_that(found, contains_exactly((('key',), 1, 2)))
+        assert_that(calls, has_length(1))
+
+
+class TestOverlay(object):
+    BASE = {'db': {'host': 'base', 'port': 1}, 'debug': False, 'name': 'base'}
+    OVERLAY = {'db': {'port': 2}, 'debug': True, 'tenant': 'acme'}
+
+    def test_it_should_read_as_merged_config(self):
+        tenant = Overlay(self.BASE, self.OVERLAY)
+
+        assert_that(tenant, is_(merge([self.BASE, self.OVERLAY])))
+        assert_that(tenant['db']['port'], is_(2))
+        assert_that(tenant['db']['host'], is_('base'))
+
+    def test_it_should_keep_merge_key_order(self):
+        tenant = Overlay(OrderedDict([('b', 1), ('a', {'x': 1})]),
+                         OrderedDict([('c', 1), ('a', {'y': 2, 'x': 3})]))
+
+        assert_that(list(tenant), contains_exactly('b', 'a', 'c'))
+        assert_that(list(tenant['a']), contains_exactly('x', 'y'))
+        assert_that(len(tenant), is_(3))
+
+    def test_it_should_keep_sections_over_values(self):
+        tenant = Overlay({'db': {'host': 'base'}, 'port': 1},
+                         {'db': 'ignored', 'port': {'number': 2}})
+
+        assert_that(tenant, is_({'db': {'host': 'base'},
+                                 'port': {'number': 2}}))
+
+    def test_it_should_share_base_sections(self):
+        tenant = Overlay(self.BASE, {'name': 'tenant'})
+
+        assert_that(tenant['db'], is_(same_instance(self.BASE['db'])))
+
+    def test_it_should_only_store_overlay_keys(self):
+        base = {'key{}'.format(n): n for n in range(1000)}
+
+        tenant = Overlay(base, {'key1': 'one'})
+
+        assert_that(tenant._own, is_({'key1': 'one'}))
+        assert_that(tenant['key1'], is_('one'))
+        assert_that(tenant['key2'], is_(2))
+
+    def test_it_should_read_base_keys_as_fast_as_overlay_keys(self):
+        base = {'key{}'.format(n): n for n in range(1000)}
+        tenant = Overlay(base, {'key1': 'one'})
+
+        def cost(key):
+            return min(timeit.repeat(lambda: tenant[key], number=10000, repeat=5))
+
+        assert_that(cost('key2'), less_than(2 * cost('key1')))
+
+    def test_it_should_fail_for_missing_keys(self):
+        tenant = Overlay(self.BASE, self.OVERLAY)
+
+        with pytest.raises(KeyError):
+            tenant['missing']
+        assert_that(tenant.get('missing'), is_(None))
+
+    def test_it_should_convert_to_dict(self):
+        tenant = Overlay(self.BASE, self.OVERLAY)
+
+        assert_that(tenant.to_dict(), is_(merge([self.BASE, self.OVERLAY])))
+
+    def test_it_should_stack_overlays(self):
+        first, second = {'db': {'port': 2}}, {'db': {'host': 'z'}, 'tenant': 'b'}
+
+        tenant = Overlay(Overlay(self.BASE, first), second)
+
+        expected = merge([self.BASE, first, second])
+        assert_that(tenant, is_(expected))
+        assert_that(tenant.to_dict(), is_(expected))
+
+    def test_it_should_work_as_a_section(self):
+        tenant = Overlay(self.BASE, self.OVERLAY)
+        merged = merge([self.BASE, self.OVERLAY])
+
+        assert_that(digest(tenant), is_(digest(merged)))
+        assert_that(list(changes(merged, tenant)), is_(empty()))
+        assert_that(ConfigIndex(tenant).get('db.port'), is_(2))
+        assert_that(freeze(tenant), is_(merged))
+        assert_that(merge([tenant, {'db': {'user': 'u'}}])['db'],
+                    is_({'host': 'base', 'port': 2, 'user': 'u'}))
+
+    def test_it_should_notify_subscribers_as_a_section(self):
+        subscriptions = Subscriptions(self.BASE)
+        found = []
+        subscriptions.subscribe('db.port', lambda *args: found.append(args))
+        subscriptions.subscribe('db.host', lambda *args: found.append(args))
+
+        changed = subscriptions.update(Overlay(self.BASE, self.OVERLAY))
+
+        assert_that(changed, contains_exactly(('db', 'port')))
+        assert_that(found, contains_exactly((1, 2)))
+
+    def test_it_should_be_dumped_as_dict(self):
+        import json
+        import toml
+        tenant = Overlay(self.BASE, self.OVERLAY)
+
+        assert_that(json.loads(json.dumps(tenant.to_dict())), is_(tenant))
+        assert_that(toml.loads(toml.dumps(tenant.to_dict())), is_(tenant))
+
+    def test_it_should_load_overlays_from_paths(self, examples):
+        base = {'section': {'key': 'base', 'other': 1}}
+
+        tenant = load_overlay(base, [examples.get('00_base.toml')])
+
+        assert_that(tenant['section'], is_({'key': 'zero', 'other': 1}))
+
+
+class TestFreeze(object):
+    def test_it_should_keep_contents_and_order(self):
+        config = {'b': {'list': [1, {'c': 2}]}, 'a': 1}
+
+        frozen = freeze(config)
+
+        assert_that(frozen, is_(config))
+        assert_that(list(frozen), contains_exactly('b', 'a'))
+
+    @pytest.mark.parametrize("modify", [
+        lambda config: config.update(key=2),
+        lambda config: config.__setitem__('new', 1),
+        lambda config: config['section'].pop('key'),
+        lambda config: config['section']['list'].append(3),
+    ])
+    def test_it_should_not_allow_modifications(self, modify):
+        frozen = freeze({'key': 1, 'section': {'key': 1, 'list': [1, 2]}})
+
+        with pytest.raises(TypeError):
+            modify(frozen)
+
+    def test_it_should_not_allow_in_place_union(self):
+        frozen = freeze({'key': 1})
+
+        with pytest.raises(TypeError):  # Also on Python 3.8, without dict |=
+            frozen |= {'key': 2}
+
+        assert_that(frozen, is_({'key': 1}))
+
+    def test_it_should_keep_indexes(self):
+        import copy
+        frozen = freeze(ConfigIndex({'section': {'key': 1, 'list': [1]}}))
+
+        assert_that(frozen.get('section.key'), is_(1))
+        with pytest.raises(TypeError):
+            frozen['section']['list'].append(2)
+        assert_that(copy.deepcopy(frozen).get('section.list'), is_([1]))
+
+    def test_it_should_allow_modifying_copies(self):
+        import copy
+        frozen = freeze({'section': {'list': [1]}})
+
+        config = copy.deepcopy(frozen)
+        config['section']['list'].append(2)
+
+        assert_that(config, has_entry('section', has_entry('list', [1, 2])))
+
+
+class TestConfigHolder(object):
+    def test_it_should_load_config_on_first_access(self):
+        holder = ConfigHolder(lambda: {'key': 1})
+
+        assert_that(holder.config, has_entry('key', 1))
+        assert_that(holder.generation, is_(1))
+
+    def test_it_should_publish_same_snapshot_until_reloaded(self):
+        values = iter([1, 2])
+        holder = ConfigHolder(lambda: {'key': next(values)})
+
+        snapshot = holder.config
+
+        assert_that(holder.config, is_(snapshot))
+        assert_that(holder.reload(), has_entry('key', 2))
+        assert_that(holder.config, has_entry('key', 2))
+
+    def test_it_should_pass_arguments_to_loader(self, examples):
+        holder = ConfigHolder(load, [examples.get('00_base.toml')])
+
+        assert_that(holder.config, has_entry('section', has_entry('key', 'zero')))
+
+    def test_it_should_keep_last_snapshot_on_errors(self):
+        holder = ConfigHolder(lambda: {'key': 1})
+        snapshot = holder.config
+        holder._load = mock.Mock(side_effect=ValueError)
+
+        with pytest.raises(ValueError):
+            holder.reload()
+
+        assert_that(holder.config, is_(snapshot))
+
+    def test_it_should_run_reloads_called_during_a_load_once(self):
+        loading, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def myloader():
+            calls.append(1)
+            loading.set()
+            release.wait(5)
+            return {'calls': len(calls)}
+
+        holder = ConfigHolder(myloader)
+        holder._lock = WaitingLock()
+        first = threading.Thread(target=holder.reload)
+        first.start()
+        loading.wait(5)
+        others = [threading.Thread(target=lambda: results.append(holder.reload()))
+                  for _ in range(5)]
+        for thread in others:
+            thread.start()
+        holder._lock.wait_for(6)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+
+        assert_that(calls, has_length(2))
+        assert_that(results, only_contains(has_entry('calls', 2)))
+        assert_that(holder.config, has_entry('calls', 2))
+
+    def test_it_should_not_share_loads_started_before_reloading(self):
+        loading, release = threading.Event(), threading.Event()
+        source = {'v': 1}
+        results = []
+
+        def myloader():
+            config = dict(source)
+            if config['v'] == 1:
+                loading.set()
+                release.wait(5)
+            return config
+
+        holder = ConfigHolder(myloader)
+        holder._lock = WaitingLock()
+        first = threading.Thread(target=holder.reload)
+        first.start()
+        loading.wait(5)
+        source['v'] = 2
+        second = threading.Thread(target=lambda: results.append(holder.reload()))
+        second.start()
+        holder._lock.wait_for(2)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        assert_that(results, contains_exactly({'v': 2}))
+
+
+    def test_it_should_keep_indexed_snapshots(self, examples):
+        holder = ConfigHolder(load_paths, [examples.get('00_base.toml')], index=True)
+
+        assert_that(holder.config.get('section.key'), is_('zero'))
+        with pytest.raises(TypeError):
+            holder.config['section']['key'] = 'one'
+
+class TestConfigIndex(object):
+    CONFIG = {
+        'db': {'pool': {'size': 10, 'timeout': 5}, 'host': 'localhost'},
+        'debug': False,
+    }
+
+    def test_it_should_work_as_the_indexed_config(self):
+        index = ConfigIndex(self.CONFIG)
+
+        assert_that(index, is_(self.CONFIG))
+        assert_that(index['db'], is_(self.CONFIG['db']))
+
+    def test_it_should_get_values_by_dotted_path(self):
+        index = ConfigIndex(self.CONFIG)
+
+        assert_that(index.get('db.pool.size'), is_(10))
+        assert_that(index.get('db.pool'), is_(self.CONFIG['db']['pool']))
+        assert_that(index.get('debug'), is_(False))
+
+    def test_it_should_return_default_for_missing_paths(self):
+        index = ConfigIndex(self.CONFIG)
+
+        assert_that(index.get('db.pool.missing'), is_(None))
+        assert_that(index.get('debug.missing', 1), is_(1))
+
+    @pytest.mark.parametrize("prefix", ['db.', 'db'])
+    def test_it_should_list_values_under_prefix(self, prefix):
+        index = ConfigIndex(self.CONFIG)
+
+        assert_that(index.items(prefix), contains_exactly(
+            ('db.pool.size', 10), ('db.pool.timeout', 5),
+            ('db.host', 'localhost'),
+        ))
+
+    def test_it_should_list_all_values_for_empty_prefix(self):
+        index = ConfigIndex(self.CONFIG)
+
+        assert_that(index.items(''), has_length(4))
+        assert_that(index.items('missing.'), is_(empty()))
+
+    def test_it_should_be_returned_by_loaders_on_demand(self, examples):
+        paths = examples.get_many(SORTED_FILES)
+
+        config = load(paths, index=True)
+
+        assert_that(config.get('section.key'), is_('second'))
+
+
+class TestSchema(object):
+    def test_it_should_convert_declared_values(self):
+        schema = Schema({'section': {
+            'port': int, 'ratio': float, 'debug': bool, 'name': str,
+            'timeout': 'duration',
+        }})
+
+        config = schema.apply({'section': {
+            'port': '80', 'ratio': '0.5', 'debug': 'yes', 'name': 1,
+            'timeout': '1m',
+        }})
+
+        assert_that(config, has_entry('section', has_entries({
+            'port': 80, 'ratio': 0.5, 'debug': True, 'name': '1',
+            'timeout': 60.0,
+        })))
+
+    def test_it_should_keep_undeclared_values_and_order(self):
+        schema = Schema({'section': {'port': int}})
+
+        config = schema.apply({'first': 1, 'section': {'a': 'b', 'port': '1'}})
+
+        assert_that(list(config), contains_exactly('first', 'section'))
+        assert_that(list(config['section'].items()), contains_exactly(
+            ('a', 'b'), ('port', 1)))
+
+    def test_it_should_convert_list_items(self):
+        schema = Schema({'ports': [int]})
+
+        config = schema.apply({'ports': ['80', 443]})
+
+        assert_that(config, has_entry('ports', [80, 443]))
+
+    def test_it_should_use_custom_coercers(self):
+        schema = Schema({'name': str.upper})
+
+        config = schema.apply({'name': 'value'})
+
+        assert_that(config, has_entry('name', 'VALUE'))
+
+    def test_it_should_not_modify_the_given_config(self):
+        original = {'section': {'port': '80'}}
+
+        Schema({'section': {'port': int}}).apply(original)
+
+        assert_that(original, has_entry('section', has_entry('port', '80')))
+
+    @pytest.mark.parametrize("spec, config", [
+        ({'port': int}, {'port': 'eighty'}),
+        ({'port': int}, {'port': 1.5}),
+        ({'port': int}, {'port': True}),
+        ({'debug': bool}, {'debug': 'maybe'}),
+        ({'section': {'port': int}}, {'section': 'port'}),
+        ({'ports': [int]}, {'ports': 80}),
+        ({'timeout': 'duration'}, {'timeout': '10 minutes'}),
+    ])
+    def test_it_should_fail_with_invalid_values(self, spec, config):
+        with pytest.raises(ValueError):
+            Schema(spec).apply(config)
+
+    def test_it_should_report_path_of_invalid_values(self):
+        schema = Schema({'section': {'port': int}})
+
+        with pytest.raises(ValueError, match="'section.port'"):
+            schema.apply({'section': {'port': 'eighty'}})
+
+    def test_it_should_fail_with_invalid_specs(self):
+        with pytest.raises(ValueError):
+            Schema({'port': 'integer'})
+
+    @pytest.mark.parametrize("value, seconds", [
+        (90, 90.0),
+        ('1.5', 1.5),
+        ('250ms', 0.25),
+        ('1h 30m', 5400.0),
+        ('2d', 172800.0),
+    ])
+    def test_it_should_convert_durations_to_seconds(self, value, seconds):
+        assert_that(coerce_duration(value), is_(seconds))
+
+    def test_it_should_be_applied_by_loaders(self, examples):
+        paths = examples.get_many(['basic_file.ini'])
+        schema = Schema({'section': {'unicode': str.encode}})
+
+        config = load(paths, schema=schema)
+
+        assert_that(config, has_entry('section', has_entry(
+            'unicode', u'💩'.encode('utf8'))))
+
+
+class TestLayerStore(object):
+    LAYERS = [
+        ('00_base.json', {'db': {'host': 'a', 'pool': {'size': 1}}, 'debug': True}),
+        ('10_scalar.json', {'db': 'ignored', 'debug': False}),
+        ('20_last.json', {'db': {'pool': {'size': 2, 'min': 1}}, 'new': [1]}),
+    ]
+
+    def test_it_should_resolve_values_as_merge(self, store):
+        assert_that(store.get('db.pool.size'), is_(2))
+        assert_that(store.get('db.host'), is_('a'))
+        assert_that(store.get(['debug']), is_(False))
+        assert_that(store.get('new'), is_([1]))
+
+    def test_it_should_return_default_for_missing_keys(self, store):
+        assert_that(store.get('db.missing'), is_(None))
+        assert_that(store.get('debug.missing', 1), is_(1))
+
+    def test_it_should_resolve_sections_as_merge(self, store):
+        assert_that(store.get('db'), is_(
+            merge([layer for _, layer in self.LAYERS])['db']
+        ))
+        assert_that(list(store.section('db.pool').items()), contains_exactly(
+            ('size', 2), ('min', 1)
+        ))
+
+    def test_it_should_resolve_whole_config_as_merge(self, store, tmpdir):
+        expected = load_paths([str(tmpdir)], extension='json',
+                              force_extension=True)
+
+        config = store.section()
+
+        assert_that(config, is_(expected))
+        assert_that(list(config), contains_exactly(*expected))
+
+    def test_it_should_only_parse_changed_files(self, store, tmpdir):
+        tmpdir.join('20_last.json').write('{"db": {"pool": {"size": 30}}}')
+        tmpdir.join('15_new.json').write('{"new": 15}')
+        tmpdir.join('10_scalar.json').remove()
+
+        parsed = store.sync([str(tmpdir)], extension='json',
+                            force_extension=True)
+
+        assert_that(parsed, contains_inanyorder(
+            str(tmpdir.join('15_new.json')), str(tmpdir.join('20_last.json')),
+        ))
+        assert_that(store.get('db.pool.size'), is_(30))
+        assert_that(store.get('debug'), is_(True))
+        assert_that(store.get('new'), is_(15))
+
+    def test_it_should_keep_layers_between_connections(self, store):
+        store.close()
+
+        other = LayerStore(store.database)
+
+        assert_that(other.get('db.pool.size'), is_(2))
+        other.close()
+
+    def test_it_should_sync_app_files(self, tmpdir, examples):
+        store = LayerStore(str(tmpdir.join('app.db')))
+        examples.clear()
+        examples.get('config.toml')
+
+        store.sync_app('myapp', prefix=str(examples.tmpdir))
+
+        assert_that(store.get('section.string'), is_('toml'))
+        store.close()
+
+    @pytest.fixture
+    def store(self, tmpdir):
+        import json
+        for name, layer in self.LAYERS:
+            tmpdir.join(name).write(json.dumps(layer))
+        store = LayerStore(str(tmpdir.join('layers.db')))
+        store.sync([str(tmpdir)], extension='json', force_extension=True)
+        yield store
+        store.close()
+
+
+class TestMemoryStats(object):
+    def test_it_should_measure_each_step(self, examples):
+        paths = sorted(examples.get_many(SORTED_FILES))
+
+        stats = memory_stats(load, paths)
+
+        assert_that(stats['discovery'], has_entries({
+            'files': 3, 'peak': greater_than(0), 'retained': greater_than(0),
+        }))
+        assert_that(stats['layers'], contains_exactly(*[
+            has_entries({'path': path, 'peak': greater_than(0)})
+            for path in paths
+        ]))
+        assert_that(stats['merge'], has_entries({
+            'peak': greater_than(0), 'retained': greater_than(0),
+        }))
+
+    def test_it_should_measure_top_level_keys(self, examples):
+        paths = examples.get_many(['basic_file.toml', 'basic_file.json'])
+
+        stats = memory_stats(load, paths)
+
+        assert_that(stats['keys'], has_entry('section', greater_than(0)))
+
+    def test_it_should_not_leave_tracing_enabled(self, examples):
+        import tracemalloc
+
+        memory_stats(load, [examples.get('00_base.toml')])
+
+        assert_that(tracemalloc.is_tracing(), is_(False))
+
+    def test_it_should_not_clear_traces_of_running_tracing(self, examples):
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+
+            with pytest.raises(RuntimeError):
+                memory_stats(load, [examples.get('00_base.toml')])
+
+            assert_that(tracemalloc.is_tracing(), is_(True))
+            assert_that(tracemalloc.get_traced_memory()[1], is_(not_(less_than(peak))))
+        finally:
+            tracemalloc.stop()
+
+    def test_it_should_count_shared_values_once(self):
+        shared = ['value'] * 100
+
+        size = deep_sizeof({'a': shared, 'b': shared})
+
+        assert_that(size, less_than(2 * deep_sizeof(shared)))
+
+
 class TestFind(object):
     def test_it_should_load_files_in_order(self, examples):
         examples.clear()
@@ -287,6 +1133,246 @@ class TestLoadPaths(object):
         assert_that(config["section"].keys(), contains_exactly(*good_data))
 
 
+class TestGetValue(object):
+    def test_it_should_get_value_from_last_file(self, examples):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+
+        value = self.get_value('section.key', examples)
+
+        assert_that(value, is_('second'))
+
+    def test_it_should_not_parse_less_relevant_files(self, examples):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+        myparser = mock.Mock(side_effect=parse)
+
+        self.get_value('section.key', examples, parser=myparser)
+
+        assert_that(myparser.call_count, is_(1))
+
+    def test_it_should_look_into_less_relevant_files(self, examples):
+        examples.clear()
+        examples.get_many(['00_base.toml', 'basic_file.toml', '01_first.json'])
+
+        value = self.get_value(['section', 'integer'], examples)
+
+        assert_that(value, is_(1))
+
+    def test_it_should_merge_sections_as_load(self, examples):
+        examples.clear()
+        paths = sorted(examples.get_many(FILES))
+
+        value = self.get_value('section', examples)
+
+        assert_that(value, is_(load(paths)['section']))
+
+    def test_it_should_return_default_for_missing_values(self, examples):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+
+        value = self.get_value('section.missing', examples, default=None)
+
+        assert_that(value, is_(None))
+
+    def test_it_should_fail_for_missing_values(self, examples):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+
+        with pytest.raises(KeyError, match="No value at key path 'section.missing'"):
+            self.get_value('section.missing', examples)
+
+    def get_value(self, path, examples, **kwargs):
+        return get_value('myapp', path, file_path=None,
+                         dir_path=str(examples.tmpdir), **kwargs)
+
+
+class TestBundles(object):
+    def test_it_should_load_as_the_packed_files(self, examples, bundles):
+        examples.clear()
+        examples.get_many(FILES + SORTED_FILES)
+        bundle = str(bundles.join('conf.d.zip'))
+
+        pack([str(examples.tmpdir)], bundle)
+
+        assert_that(load_paths([bundle]), is_(load_paths([str(examples.tmpdir)])))
+
+    def test_it_should_keep_files_in_order(self, examples, bundles):
+        examples.clear()
+        paths = examples.get_many(SORTED_FILES)
+        bundle = str(bundles.join('sorted.zip'))
+
+        pack([str(examples.tmpdir)], bundle)
+
+        assert_that(find(bundle), contains_exactly(*[
+            os.path.join(bundle, os.path.basename(path))
+            for path in sorted(paths)
+        ]))
+
+    def test_it_should_filter_extensions(self, examples, bundles):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+        bundle = str(bundles.join('filtered.zip'))
+
+        packed = pack([str(examples.tmpdir)], bundle, extension='toml',
+                      force_extension=True)
+
+        assert_that(packed, contains_exactly(examples.get('00_base.toml')))
+
+    def test_it_should_fail_to_pack_files_with_same_name(self, examples, bundles):
+        path = examples.get('00_base.toml')
+
+        with pytest.raises(ValueError):
+            pack([path, path], str(bundles.join('twice.zip')))
+
+    def test_it_should_open_bundle_once(self, examples, bundles):
+        examples.clear()
+        examples.get_many(SORTED_FILES)
+        bundle = str(bundles.join('once.zip'))
+        pack([str(examples.tmpdir)], bundle)
+
+        with mock.patch('confight.Bundle', side_effect=Bundle) as bundles:
+            load_paths([bundle])
+
+        assert_that(bundles.call_count, is_(1))
+
+    @pytest.mark.parametrize("use_mmap", [True, False])
+    def test_it_should_read_bundles(self, use_mmap, examples, bundles):
+        bundle_path = str(bundles.join('read.zip'))
+        pack([examples.get('00_base.toml')], bundle_path)
+
+        bundle = Bundle(bundle_path, use_mmap=use_mmap)
+
+        assert_that(bundle.names(), contains_exactly('00_base.toml'))
+        assert_that(bundle.open('00_base.toml').read(),
+                    is_(examples.get_contents('00_base.toml')))
+        bundle.close()
+
+    @pytest.fixture
+    def bundles(self, tmpdir_factory):
+        return tmpdir_factory.mktemp('bundles')
+
+
+class TestLoadTimeout(object):
+    def test_it_should_load_within_timeout(self, examples):
+        paths = examples.get_many(SORTED_FILES)
+
+        config = load_paths(paths, timeout=5)
+
+        assert_that(config, has_entry('section', has_entry('key', 'second')))
+
+    def test_it_should_fail_reporting_slow_path(self, examples):
+        paths = [examples.get('00_base.toml'), '/hung/nfs/conf.d']
+
+        with pytest.raises(LoadTimeout) as error:
+            load_paths(paths, finder=self.hung_finder(), timeout=0.05)
+
+        assert_that(error.value.path, is_('/hung/nfs/conf.d'))
+        assert_that(str(error.value), contains_string('/hung/nfs/conf.d'))
+
+    def test_it_should_report_slow_files(self, examples):
+        path = examples.get('00_base.toml')
+        release = threading.Event()
+
+        def hung_parser(path, format=None):
+            release.wait(5)
+
+        try:
+            with pytest.raises(LoadTimeout) as error:
+                load_paths([path], parser=hung_parser, timeout=0.05)
+        finally:
+            release.set()
+
+        assert_that(error.value.path, is_(path))
+
+    def test_it_should_fallback_to_last_loaded_config(self, examples):
+        paths = [examples.get('00_base.toml'), '/hung/nfs/conf.d']
+        loaded = load_paths(paths, timeout=5)
+
+        config = load_paths(paths, finder=self.hung_finder(), timeout=0.05,
+                            fallback=True)
+
+        assert_that(config, is_(loaded))
+
+    def test_it_should_fail_without_config_to_fallback(self):
+        with pytest.raises(LoadTimeout):
+            load_paths(['/hung/never/loaded'], finder=self.hung_finder(),
+                       timeout=0.05, fallback=True)
+
+    def test_it_should_raise_loading_errors(self, examples):
+        examples.create('broken.toml', b'[broken')
+
+        with pytest.raises(ValueError):
+            load_paths([str(examples.tmpdir.join('broken.toml'))], timeout=5)
+
+    def test_it_should_accept_timeout_in_app_loaders(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+
+        config = load_app('myapp', prefix=str(examples.tmpdir), timeout=5)
+
+        assert_that(config, has_entry('section', has_entry('string', 'toml')))
+
+    def test_it_should_not_fallback_to_discovered_files(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+        finder, hang = self.switchable_finder()
+        get_value('app', 'section.string', prefix=str(examples.tmpdir), finder=finder,
+                  timeout=5, fallback=True)
+        hang.set()
+
+        with pytest.raises(LoadTimeout):
+            load_app('app', prefix=str(examples.tmpdir), finder=finder, timeout=0.05,
+                     fallback=True)
+
+    def test_it_should_not_serve_configs_as_discovered_files(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+        finder, hang = self.switchable_finder()
+        load_app('app', prefix=str(examples.tmpdir), finder=finder, timeout=5)
+        hang.set()
+
+        with pytest.raises(LoadTimeout):
+            get_value('app', 'section.string', prefix=str(examples.tmpdir), finder=finder,
+                      timeout=0.05, fallback=True)
+
+    def test_it_should_not_fallback_to_configs_loaded_with_other_options(self, examples):
+        paths = [examples.get('00_base.toml'), '/hung/nfs/conf.d']
+        load_paths(paths, timeout=5)
+
+        with pytest.raises(LoadTimeout):
+            load_paths(paths, finder=self.hung_finder(), timeout=0.05, fallback=True,
+                       index=True)
+
+    def switchable_finder(self):
+        """Finder hanging for every path once the returned event is set"""
+        hang, release = threading.Event(), threading.Event()
+        self.releases.append(release)
+
+        def myfinder(path):
+            if hang.is_set():
+                release.wait(5)
+            return find(path)
+        return myfinder, hang
+
+    def hung_finder(self):
+        release = threading.Event()
+        self.releases.append(release)
+
+        def myfinder(path):
+            if path.startswith('/hung'):
+                release.wait(5)
+            return find(path)
+        return myfinder
+
+    def setup_method(self):
+        self.releases = []
+
+    def teardown_method(self):
+        for release in self.releases:
+            release.set()
+
+
 class LoadAppBehaviour(object):
     def loaded_paths(self, config):
         return sorted(config, key=lambda k: config[k])
@@ -447,6 +1533,298 @@ class TestLoadUserApp(LoadAppBehaviour):
         return self.call_config_loader(load_user_app, *args, **kwargs)
 
 
+class TestLoadApps(object):
+    def test_it_should_load_every_app_by_name(self, tmpdir):
+        for name in ['first', 'second']:
+            tmpdir.join(name, 'config.toml').write(
+                'name = "{}"'.format(name), ensure=True)
+
+        configs = load_apps(['first', 'second'], finder=self.finder(tmpdir))
+
+        assert_that(configs, has_entries({
+            'first': has_entry('name', 'first'),
+            'second': has_entry('name', 'second'),
+        }))
+
+    def test_it_should_keep_the_order_of_the_names(self, tmpdir):
+        configs = load_apps(['b', 'a', 'c'], finder=self.finder(tmpdir))
+
+        assert_that(list(configs), contains_exactly('b', 'a', 'c'))
+
+    def test_it_should_parse_shared_files_only_once(self, examples):
+        shared = examples.get('00_base.toml')
+        parsed = []
+
+        def myparser(path, format=None):
+            parsed.append(path)
+            return parse(path, format)
+
+        configs = load_apps(['first', 'second'], parser=myparser,
+                            file_path=shared, dir_path=None)
+
+        assert_that(parsed, contains_exactly(shared))
+        assert_that(configs, has_entries({
+            'first': has_entry('section', has_entry('key', 'zero')),
+            'second': has_entry('section', has_entry('key', 'zero')),
+        }))
+
+    def test_it_should_not_share_values_between_apps(self, examples):
+        shared = examples.create('shared.toml', b'list = [1]\n[section]\nlist = [1]')
+
+        configs = load_apps(['a', 'b'], file_path=shared, dir_path=None)
+        configs['a']['list'].append(2)
+        configs['a']['section']['list'].append(2)
+
+        assert_that(configs['b'], is_({'list': [1], 'section': {'list': [1]}}))
+
+    def test_it_should_parse_files_in_processes(self, examples):
+        first = examples.create('first.toml', b'date = 2024-01-01T00:00:00+02:00')
+        second = examples.create('second.json', b'{"key": [1, 2]}')
+
+        configs = load_apps(['a', 'b'], file_path=first, dir_path=None, paths=[second],
+                            max_workers=2)
+
+        assert_that(configs['b'], is_(load_paths([first, second])))
+        assert_that(configs['b']['date'].utcoffset().total_seconds(), is_(7200))
+
+    def test_it_should_raise_errors_of_parsing_processes(self, examples):
+        paths = [examples.create('good.json', b'{}'), examples.create('bad.toml', b'a = = 1')]
+
+        with pytest.raises(ValueError):
+            load_apps(['a'], file_path=None, dir_path=None, paths=paths, max_workers=2)
+
+    def test_it_should_use_given_loader(self, examples):
+        user_file = examples.get('00_base.toml')
+
+        configs = load_apps(['app'], loader=load_user_app, prefix='/nowhere',
+                            user_file_path=user_file)
+
+        assert_that(configs, has_entry(
+            'app', has_entry('section', has_entry('key', 'zero'))))
+
+    def finder(self, tmpdir):
+        def myfinder(path):
+            relative = os.path.relpath(path, '/etc')
+            return find(str(tmpdir.join(relative)))
+        return myfinder
+
+
+class TestHttpSource(object):
+    def test_it_should_parse_served_configs(self, server):
+        server.documents['/config.toml'] = Repository._contents['00_base.toml']
+
+        config = HttpSource().parse(server.url('/config.toml'))
+
+        assert_that(config, has_entry('section', has_entry('key', 'zero')))
+
+    def test_it_should_use_given_format(self, server):
+        server.documents['/config'] = Repository._contents['01_first.json']
+
+        config = HttpSource().parse(server.url('/config'), 'json')
+
+        assert_that(config, has_entry('section', has_entry('key', 'first')))
+
+    def test_it_should_fail_for_error_responses(self, server):
+        with pytest.raises(ValueError, match='404'):
+            HttpSource().parse(server.url('/missing.toml'))
+
+    def test_it_should_not_parse_unchanged_documents_again(self, server):
+        server.documents['/config.toml'] = Repository._contents['00_base.toml']
+        source = HttpSource()
+
+        first = source.parse(server.url('/config.toml'))
+        second = source.parse(server.url('/config.toml'))
+
+        assert_that(second, is_(first))
+        assert_that(server.statuses, contains_exactly(200, 304))
+
+    def test_it_should_fetch_changed_documents(self, server):
+        server.documents['/config.toml'] = Repository._contents['00_base.toml']
+        source = HttpSource()
+        source.parse(server.url('/config.toml'))
+        server.documents['/config.toml'] = Repository._contents['config.toml']
+
+        config = source.parse(server.url('/config.toml'))
+
+        assert_that(config, has_entry('section', has_entry('string', 'toml')))
+        assert_that(server.statuses, contains_exactly(200, 200))
+
+    def test_it_should_reuse_connections(self, server):
+        server.documents['/config.toml'] = Repository._contents['00_base.toml']
+        source = HttpSource()
+
+        for _ in range(3):
+            source.parse(server.url('/config.toml'))
+
+        assert_that(set(server.clients), has_length(1))
+
+    def test_it_should_fetch_several_urls(self, server):
+        server.documents['/a.toml'] = Repository._contents['00_base.toml']
+        server.documents['/b.json'] = Repository._contents['01_first.json']
+        urls = [server.url('/a.toml'), server.url('/b.json')]
+
+        configs = HttpSource().fetch_all(urls)
+
+        assert_that(configs, has_entries({
+            urls[0]: has_entry('section', has_entry('key', 'zero')),
+            urls[1]: has_entry('section', has_entry('key', 'first')),
+        }))
+
+    def test_it_should_load_urls_with_files(self, server, examples):
+        server.documents['/a.json'] = Repository._contents['01_first.json']
+        server.documents['/b.ini'] = Repository._contents['AA_second.ini']
+        paths = [examples.get('00_base.toml'), server.url('/a.json')]
+
+        config = load_paths(paths + [server.url('/b.ini')])
+
+        assert_that(config, has_entry('section', has_entry('key', 'second')))
+
+
+class TestCheckApps(object):
+    def test_it_should_report_every_error_with_its_position(self, examples):
+        examples.clear()
+        examples.tmpdir.mkdir('conf.d')
+        good = examples.create('conf.d/00_good.toml', b'key = 1')
+        json_file = examples.create('conf.d/10_bad.json', b'{\n  "key": 1,\n}')
+        toml_file = examples.create('conf.d/20_bad.toml', b'key = 1\nkey = = 2')
+        ini_file = examples.create('conf.d/30_bad.ini', b'key = 1')
+
+        errors = check_apps(['app'], prefix=str(examples.tmpdir))
+
+        assert_that(errors, contains_exactly(
+            has_properties(path=json_file, line=3, column=1),
+            has_properties(path=toml_file, line=2, column=1),
+            has_properties(path=ini_file, line=1),
+        ))
+        assert_that([error.path for error in errors], not_(has_item(good)))
+
+    def test_it_should_check_shared_files_once(self, examples):
+        examples.clear()
+        path = examples.create('shared.json', b'{')
+
+        errors = check_apps(['first', 'second'], file_path=path, dir_path=None)
+
+        assert_that(errors, contains_exactly(has_properties(path=path, line=1)))
+
+    def test_it_should_report_nothing_for_valid_configs(self, examples):
+        paths = examples.get_many(['00_base.toml', '01_first.json'])
+
+        errors = check_apps(['app'], file_path=None, dir_path=None, paths=paths,
+                            max_workers=2)
+
+        assert_that(errors, is_(empty()))
+
+    def test_it_should_report_discovery_errors_by_app_name(self):
+        def broken_loader(name, **kwargs):
+            raise ValueError('Broken')
+
+        errors = check_apps(['app'], loader=broken_loader)
+
+        assert_that(errors, contains_exactly(CheckError('app', None, None, 'Broken')))
+
+    def test_errors_should_show_as_compiler_messages(self):
+        assert_that(str(CheckError('a.toml', 3, 8, 'Bad')), is_('a.toml:3:8: Bad'))
+        assert_that(str(CheckError('a.ini', 3, None, 'Bad')), is_('a.ini:3: Bad'))
+        assert_that(str(CheckError('app', None, None, 'Bad')), is_('app: Bad'))
+
+
+class TestMetrics(object):
+    def test_it_should_record_nothing_when_disabled(self, examples):
+        metrics.reset()
+
+        load([examples.get('00_base.toml')])
+
+        assert_that(metrics.get('loads'), is_(0))
+        assert_that(metrics.get('files_parsed'), is_(0))
+
+    def test_it_should_count_loads_files_and_bytes(self, enabled_metrics, examples):
+        paths = examples.get_many(['00_base.toml', '01_first.json'])
+
+        load(paths)
+
+        assert_that(metrics.get('loads'), is_(1))
+        assert_that(metrics.get('files_parsed'), is_(2))
+        assert_that(metrics.get('bytes_read'),
+                    is_(sum(os.path.getsize(path) for path in paths)))
+        assert_that(metrics.histogram('load_duration_seconds')['count'], is_(1))
+
+    def test_it_should_not_count_file_discovery_as_loads(self, enabled_metrics, examples):
+        path = examples.get('00_base.toml')
+
+        load_apps(['first', 'second'], file_path=path, dir_path=None)
+
+        assert_that(metrics.get('loads'), is_(0))
+        assert_that(metrics.get('apps_loaded'), is_(2))
+        assert_that(metrics.get('files_parsed'), is_(1))
+        assert_that(metrics.histogram('load_duration_seconds')['count'], is_(0))
+        assert_that(metrics.histogram('batch_load_duration_seconds')['count'], is_(1))
+
+    def test_it_should_count_loads_with_any_merger(self, enabled_metrics, examples):
+        load([examples.get('00_base.toml')], merger=list)
+
+        assert_that(metrics.get('loads'), is_(1))
+
+    def test_it_should_not_count_bundles_opened_to_list_files(self, enabled_metrics, examples,
+                                                             tmpdir):
+        bundle = str(tmpdir.join('conf.d.zip'))
+        pack([examples.get('00_base.toml')], bundle)
+
+        get_value('app', 'section.key', file_path=bundle, dir_path=None)
+
+        assert_that(metrics.get('cache_misses', 'bundle'), is_(0))
+        assert_that(metrics.get('cache_hits', 'bundle'), is_(1))
+
+    def test_it_should_count_cache_hits(self, enabled_metrics, examples):
+        paths = examples.get_many(['00_base.toml', '01_first.json'])
+        parser = CachedParser()
+
+        load(paths, parser=parser)
+        load(paths, parser=parser)
+
+        assert_that(metrics.get('files_parsed'), is_(2))
+        assert_that(metrics.get('files_skipped'), is_(2))
+        assert_that(metrics.get('cache_hits', 'parser'), is_(2))
+        assert_that(metrics.hit_ratio('parser'), is_(0.5))
+        assert_that(metrics.hit_ratio('http'), is_(None))
+
+    def test_it_should_count_not_modified_documents(self, enabled_metrics, server):
+        server.documents['/config.toml'] = Repository._contents['00_base.toml']
+        source = HttpSource()
+
+        source.parse(server.url('/config.toml'))
+        source.parse(server.url('/config.toml'))
+
+        assert_that(metrics.get('cache_hits', 'http'), is_(1))
+        assert_that(metrics.get('cache_misses', 'http'), is_(1))
+        assert_that(metrics.get('bytes_read'),
+                    is_(len(Repository._contents['00_base.toml'].encode('utf8'))))
+
+    def test_it_should_time_reloads(self, enabled_metrics, examples):
+        holder = ConfigHolder(load, [examples.get('00_base.toml')])
+
+        holder.reload()
+        holder.reload()
+
+        histogram = metrics.histogram('reload_duration_seconds')
+        assert_that(histogram['count'], is_(2))
+        assert_that(histogram['buckets']['+Inf'], is_(2))
+
+    def test_it_should_export_prometheus_text(self):
+        registry = Metrics(enabled=True)
+        registry.inc('loads', 3)
+        registry.cache('parser', True)
+        registry.observe('load_duration_seconds', 0.02)
+
+        text = registry.export()
+
+        assert_that(text, contains_string('# TYPE confight_loads_total counter\n'
+                                          'confight_loads_total 3\n'))
+        assert_that(text, contains_string('confight_cache_hits_total{cache="parser"} 1\n'))
+        assert_that(text, contains_string('confight_load_duration_seconds_bucket{le="0.01"} 0\n'
+                                          'confight_load_duration_seconds_bucket{le="0.025"} 1\n'))
+        assert_that(text, contains_string('confight_load_duration_seconds_count 1\n'))
+
+
 class TestCli(object):
     def test_it_should_print_help(self):
         out = subprocess.run([self.bin], stderr=subprocess.PIPE)
@@ -472,6 +1850,144 @@ class TestCli(object):
         assert_that(out.stdout.decode('utf8'), is_(contents))
         assert_that(out.returncode, is_(0))
 
+    def test_it_should_show_config_of_several_apps(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+
+        out = self.run(['show', 'first', 'second',
+                        '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8'), contains_string('[first.section]'))
+        assert_that(out.stdout.decode('utf8'), contains_string('[second.section]'))
+        assert_that(out.returncode, is_(0))
+
+    def test_it_should_show_config_digest(self, examples):
+        examples.clear()
+        path = examples.get('config.toml')
+
+        out = self.run(['digest', 'name', '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8').strip(), is_(digest(parse(path))))
+        assert_that(out.returncode, is_(0))
+
+    def test_it_should_check_configs(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+        examples.tmpdir.mkdir('conf.d')
+        path = examples.create('conf.d/bad.json', b'{')
+
+        out = self.run(['check', 'first', 'second', '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8'), starts_with(path + ':1:2: '))
+        assert_that(out.stdout.decode('utf8').count('\n'), is_(1))
+        assert_that(out.returncode, is_(1))
+
+    def test_it_should_show_metrics(self, examples):
+        examples.clear()
+        path = examples.get('config.toml')
+
+        out = self.run(['metrics', 'name', '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8'), contains_string('confight_loads_total 1\n'))
+        assert_that(out.stdout.decode('utf8'), contains_string(
+            'confight_bytes_read_total {}\n'.format(os.path.getsize(path))))
+        assert_that(out.returncode, is_(0))
+
+    def test_it_should_stream_config_changes(self, examples):
+        import json
+        examples.clear()
+        examples.create('config.toml', b'[section]\nkey = 1\nother = 2')
+        process = subprocess.Popen(
+            [self.bin, 'show', 'name', '--prefix', str(examples.tmpdir),
+             '--watch', '--interval', '0.01'],
+            stdout=subprocess.PIPE
+        )
+        try:
+            first = json.loads(process.stdout.readline().decode('utf8'))
+            os.rename(examples.create('new.toml', b'[section]\nother = 3'),
+                      str(examples.tmpdir.join('config.toml')))
+            second = json.loads(process.stdout.readline().decode('utf8'))
+            third = json.loads(process.stdout.readline().decode('utf8'))
+        finally:
+            process.kill()
+            process.wait()
+
+        assert_that(first, is_({
+            'path': ['section'], 'value': {'key': 1, 'other': 2}
+        }))
+        assert_that(second, is_({'path': ['section', 'key'], 'removed': True}))
+        assert_that(third, is_({'path': ['section', 'other'], 'value': 3}))
+
+    def test_it_should_show_memory_stats(self, examples):
+        examples.clear()
+        path = examples.get('config.toml')
+
+        out = self.run(['stats', 'name', '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8'), contains_string(path))
+        assert_that(out.stdout.decode('utf8'), contains_string('section'))
+        assert_that(out.returncode, is_(0))
+
+    @pytest.mark.parametrize("key, output", [
+        ('section.string', 'toml\n'),
+        ('section', 'string = "toml"\n'),
+    ])
+    def test_it_should_show_single_values(self, key, output, examples):
+        examples.clear()
+        examples.get('config.toml')
+
+        out = self.run(['get', 'name', key, '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stdout.decode('utf8'), is_(output))
+        assert_that(out.returncode, is_(0))
+
+    def test_it_should_fail_for_missing_values(self, examples):
+        examples.clear()
+        examples.get('config.toml')
+
+        out = self.run(['get', 'name', 'section.missing',
+                        '--prefix', str(examples.tmpdir)])
+
+        assert_that(out.stderr.decode('utf8'), contains_string(
+            "Error: No value at key path 'section.missing'\n"))
+        assert_that(out.returncode, is_(1))
+
+    def test_it_should_pack_bundles(self, examples, tmpdir_factory):
+        examples.clear()
+        examples.get('config.toml')
+        bundle = str(tmpdir_factory.mktemp('bundles').join('cli.zip'))
+
+        out = self.run(['pack', bundle, str(examples.tmpdir)])
+
+        assert_that(out.returncode, is_(0))
+        assert_that(load_paths([bundle]), has_entry('section', has_key('string')))
+
+    def test_it_should_diff_and_patch_configs(self, examples, tmpdir):
+        old = examples.create('old.toml', b'[a]\nb = 1\nc = 2\n')
+        new = examples.create('new.toml', b'[a]\nc = 3\nd = 4\n')
+
+        delta = self.run(['diff', old, new])
+        tmpdir.join('delta.json').write(delta.stdout, 'wb')
+        out = self.run(['patch', old, str(tmpdir.join('delta.json'))])
+
+        assert_that(out.stdout.decode('utf8'),
+                    is_(u'[a]\nc = 3\nd = 4\n'))
+        assert_that(out.returncode, is_(0))
+
+    @pytest.mark.parametrize("old, new", [
+        (b'd = 2024-01-01T00:00:00Z', b'd = 2024-01-02T00:00:00Z'),
+        (b'a = 1', b'a = 1\nd = 2024-01-01'),
+    ])
+    def test_it_should_fail_for_deltas_not_written_as_json(self, examples, old, new):
+        old = examples.create('old.toml', old)
+        new = examples.create('new.toml', new)
+
+        out = self.run(['diff', old, new])
+
+        assert_that(out.stderr.decode('utf8'), contains_string("can't be written as JSON"))
+        assert_that(out.stdout, is_(b''))
+        assert_that(out.returncode, is_(1))
+
     def run(self, args):
         return subprocess.run(
             [self.bin] + list(args),
@@ -514,6 +2030,77 @@ if getattr(subprocess, 'run', None) is None:
     subprocess.run = maimed_run
 
 
+class WaitingLock(object):
+    """Lock counting the threads that tried to acquire it"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self.waiting = 0
+
+    def __enter__(self):
+        with self._condition:
+            self.waiting += 1
+            self._condition.notify_all()
+        self._lock.acquire()
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+    def wait_for(self, count):
+        with self._condition:
+            self._condition.wait_for(lambda: self.waiting >= count, 5)
+
+
+class ConfigServer(object):
+    """Local HTTP server of config documents supporting ETags"""
+    def __init__(self):
+        import hashlib
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        owner = self
+        self.documents = {}
+        self.statuses = []
+        self.clients = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                owner.clients.append(self.client_address)
+                if self.path not in owner.documents:
+                    return self.reply(404, b'')
+                body = owner.documents[self.path].encode('utf8')
+                etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    return self.reply(304, b'', etag)
+                self.reply(200, body, etag)
+
+            def reply(self, status, body, etag=None):
+                owner.statuses.append(status)
+                self.send_response(status)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.01,))
+        self.thread.start()
+
+    def url(self, path):
+        return 'http://127.0.0.1:{}{}'.format(self.server.server_port, path)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
 class Repository(object):
     def __init__(self, tmpdir):
         self.tmpdir = tmpdir
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""Differential tests of the optimized load paths against reference code
+
+Random layers and conf.d trees are generated in every format in FORMATS and
+loaded both with the reference implementation of find, parse and merge and
+with every optimized pipeline, which must give the same config, key order
+and value types included. The time taken by each pipeline is recorded in the
+``timings`` user property of each test report, and the totals per pipeline
+are shown at the end of the run by the hook in conftest.py.
+"""
+import glob
+import io
+import json
+import os
+import random
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+
+import pytest
+import toml
+from hamcrest import assert_that, is_
+
+from confight import (
+    FORMATS,
+    CachedParser,
+    ConfigIndex,
+    LayerStore,
+    Overlay,
+    diff,
+    get_value,
+    load,
+    load_apps,
+    load_paths,
+    merge,
+    pack,
+    parse,
+    patch,
+)
+
+SEEDS = range(25)
+KEYS = "abcdefg"
+
+
+def reference_merge(configs):
+    """merge as in confight 2.0"""
+    result = OrderedDict()
+    keys = OrderedDict((key, None) for config in configs for key in config)
+    for key in keys:
+        values = [config[key] for config in configs if key in config]
+        merges = [v for v in values if isinstance(v, dict)]
+        result[key] = reference_merge(merges) if merges else values[-1]
+    return result
+
+
+def reference_find(path):
+    """find as in confight 2.0, for readable files and directories"""
+    path = os.path.abspath(os.path.expanduser(path))
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "*")))
+
+
+def reference_load(paths):
+    files = [file for path in paths for file in reference_find(path)]
+    return reference_merge([parse(file) for file in files])
+
+
+def canonical(value):
+    """Comparable form of a config keeping key order and value types"""
+    if isinstance(value, Mapping):
+        return ["dict"] + [[key, canonical(item)] for key, item in value.items()]
+    elif isinstance(value, (list, tuple)):
+        return ["list"] + [canonical(item) for item in value]
+    for kind in (bool, int, float, str):
+        if isinstance(value, kind):
+            return [kind.__name__, kind(value)]
+    return [type(value).__name__, value]
+
+
+def assert_same(actual, expected):
+    assert_that(canonical(actual), is_(canonical(expected)))
+
+
+class Generator(object):
+    """Random layers, all sharing the same shape unless conflicts allowed
+
+    With a shared shape a key path is always a section or always a value in
+    every layer, otherwise a key path can be a section in some layers and a
+    value in others.
+    """
+
+    def __init__(self, seed, conflicts=False):
+        self.random = random.Random(seed)
+        self.conflicts = conflicts
+        self.shape = self.random_shape(0)
+
+    def random_shape(self, depth):
+        shape = OrderedDict()
+        for key in self.random.sample(KEYS, self.random.randint(1, 5)):
+            is_section = depth < 3 and self.random.random() < 0.4
+            shape[key] = self.random_shape(depth + 1) if is_section else None
+        return shape
+
+    def layer(self, format):
+        """Random layer of the given format"""
+        if format == "ini":
+            return self.ini_layer()
+        return self.random_layer(self.shape, format)
+
+    def random_layer(self, shape, format):
+        layer = OrderedDict()
+        keys = list(shape)
+        self.random.shuffle(keys)
+        for key in keys[: self.random.randint(0, len(keys))]:
+            is_section = shape[key] is not None
+            if self.conflicts and self.random.random() < 0.2:
+                is_section = not is_section
+            if is_section:
+                layer[key] = self.random_layer(shape[key] or self.shape, format)
+            else:
+                layer[key] = self.value(format)
+        return layer
+
+    def shuffled(self, config):
+        """Copy of config with some sections reordered and keys removed"""
+        keys = [key for key in config if self.random.random() < 0.9]
+        if self.random.random() < 0.5:
+            self.random.shuffle(keys)
+        return OrderedDict(
+            (key, self.shuffled(config[key]) if isinstance(config[key], dict) else config[key])
+            for key in keys
+        )
+
+    def ini_layer(self):
+        """ini only has sections of strings"""
+        layer = OrderedDict()
+        for key, shape in self.shape.items():
+            if shape is None or self.random.random() < 0.3:
+                continue
+            values = [name for name, value in shape.items() if value is None]
+            layer[key] = OrderedDict(
+                (name, self.string()) for name in values if self.random.random() < 0.7
+            )
+        return layer
+
+    def value(self, format):
+        kinds = [self.random_int, self.random_float, self.string, self.boolean, self.random_list]
+        if format not in ("toml", "hcl"):
+            kinds.append(lambda: None)
+        return self.random.choice(kinds)()
+
+    def random_int(self):
+        return self.random.randint(-1000, 1000)
+
+    def random_float(self):
+        return self.random.randint(-1000, 1000) / 8.0
+
+    def string(self):
+        return "".join(self.random.choice("xyz💩 ") for _ in range(5)).strip()
+
+    def boolean(self):
+        return self.random.random() < 0.5
+
+    def random_list(self):
+        return [self.random_int() for _ in range(self.random.randint(0, 3))]
+
+    def conf_d(self, directory, formats, count):
+        """Write count random layers to a conf.d directory"""
+        for number in range(count):
+            format = self.random.choice(formats)
+            name = "{:02d}_droplet.{}".format(number, EXTENSIONS[format])
+            WRITERS[format](os.path.join(directory, name), self.layer(format))
+
+
+def write_json(path, layer):
+    with io.open(path, "w", encoding="utf8") as stream:
+        json.dump(layer, stream, ensure_ascii=False)
+
+
+def write_toml(path, layer):
+    with io.open(path, "w", encoding="utf8") as stream:
+        toml.dump(layer, stream)
+
+
+def write_ini(path, layer):
+    with io.open(path, "w", encoding="utf8") as stream:
+        for section, values in layer.items():
+            stream.write("[{}]\n".format(section))
+            for key, value in values.items():
+                stream.write("{} = {}\n".format(key, value))
+
+
+def write_yaml(path, layer):
+    from ruamel.yaml import YAML
+
+    with io.open(path, "w", encoding="utf8") as stream:
+        YAML(typ="rt").dump(json.loads(json.dumps(layer)), stream)
+
+
+WRITERS = {
+    "json": write_json,
+    "toml": write_toml,
+    "ini": write_ini,
+    "yaml": write_yaml,
+    "hcl": write_json,  # HCL is a superset of JSON
+}
+EXTENSIONS = {format: format for format in WRITERS}
+FORMAT_CASES = sorted(FORMATS) + ["mixed"]
+
+
+def formats_for(case):
+    return sorted(FORMATS) if case == "mixed" else [case]
+
+
+def leaf_paths(config, prefix=()):
+    for key, value in config.items():
+        if isinstance(value, dict):
+            for path in leaf_paths(value, prefix + (key,)):
+                yield path
+        else:
+            yield prefix + (key,)
+
+
+class Timings(object):
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    def run(self, name, function, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+
+@pytest.fixture
+def timings(request):
+    timings = Timings()
+    yield timings
+    request.node.user_properties.append(("timings", dict(timings.totals)))
+
+
+class TestMergeEquivalence(object):
+    @pytest.mark.parametrize("seed", SEEDS)
+    @pytest.mark.parametrize("conflicts", [False, True])
+    def test_merge_should_match_reference(self, seed, conflicts, timings):
+        generator = Generator(seed, conflicts)
+        layers = [generator.layer("json") for _ in range(8)]
+
+        expected = timings.run("reference", reference_merge, layers)
+        actual = timings.run("merge", merge, layers)
+
+        assert_same(actual, expected)
+
+
+class TestOverlayEquivalence(object):
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_overlays_should_match_reference(self, seed, timings):
+        generator = Generator(seed, conflicts=True)
+        base = merge([generator.layer("json") for _ in range(8)])
+        overlays = [generator.layer("json") for _ in range(3)]
+
+        expected = timings.run("reference", reference_merge, [base] + overlays)
+        actual = timings.run("overlay", Overlay, base, merge(overlays))
+
+        assert_same(actual, expected)
+
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_stacked_overlays_should_match_reference(self, seed, timings):
+        generator = Generator(seed, conflicts=True)
+        base = merge([generator.layer("json") for _ in range(8)])
+        overlays = [generator.layer("json") for _ in range(3)]
+
+        def stack(base, overlays):
+            for overlay in overlays:
+                base = Overlay(base, overlay)
+            return base
+
+        expected = timings.run("reference", reference_merge, [base] + overlays)
+        actual = timings.run("stacked_overlay", stack, base, overlays)
+
+        assert_same(actual, expected)
+        assert_same(actual.to_dict(), expected)
+
+
+class TestDeltaEquivalence(object):
+    @pytest.mark.parametrize("seed", SEEDS)
+    def test_patch_should_reproduce_new_config(self, seed, timings):
+        generator = Generator(seed, conflicts=True)
+        old = merge([generator.layer("json") for _ in range(4)])
+        new = merge([old] + [generator.layer("json") for _ in range(2)])
+        new = generator.shuffled(new)
+
+        delta = json.loads(timings.run("diff", lambda: json.dumps(diff(old, new))))
+        result = timings.run("patch", patch, old, delta)
+
+        assert_same(result, new)
+
+
+class TestLoadEquivalence(object):
+    @pytest.mark.parametrize("seed", SEEDS)
+    @pytest.mark.parametrize("case", FORMAT_CASES)
+    def test_pipelines_should_match_reference(self, case, seed, tmpdir, timings):
+        generator = Generator(seed, conflicts=True)
+        conf_d = str(tmpdir.mkdir("conf.d"))
+        generator.conf_d(conf_d, formats_for(case), 12)
+        expected = timings.run("reference", reference_load, [conf_d])
+
+        for name, pipeline in self.pipelines(str(tmpdir)):
+            assert_same(timings.run(name, pipeline, conf_d), expected)
+
+    @pytest.mark.parametrize("seed", SEEDS)
+    @pytest.mark.parametrize("case", FORMAT_CASES)
+    def test_lookups_should_match_reference(self, case, seed, tmpdir, timings):
+        generator = Generator(seed)
+        conf_d = str(tmpdir.mkdir("conf.d"))
+        generator.conf_d(conf_d, formats_for(case), 12)
+        expected = reference_load([conf_d])
+        index = ConfigIndex(expected)
+
+        for path in leaf_paths(expected):
+            value = self.lookup(expected, path)
+            assert_same(
+                timings.run("get_value", get_value, "app", path, file_path=None, dir_path=conf_d),
+                value,
+            )
+            assert_same(timings.run("index", index.get, ".".join(path)), value)
+
+    def pipelines(self, workdir):
+        def with_load_apps(conf_d):
+            return load_apps(["app"], file_path=None, dir_path=conf_d)["app"]
+
+        def with_bundle(conf_d):
+            bundle = os.path.join(workdir, "conf.d.zip")
+            pack([conf_d], bundle)
+            return load_paths([bundle])
+
+        def with_cached_parser(conf_d):
+            parser = CachedParser()
+            load_paths([conf_d], parser=parser)
+            return load_paths([conf_d], parser=parser)
+
+        def with_layer_store(conf_d):
+            store = LayerStore(os.path.join(workdir, "layers.db"))
+            try:
+                store.sync([conf_d])
+                return store.section()
+            finally:
+                store.close()
+
+        return [
+            ("load_paths", lambda conf_d: load_paths([conf_d])),
+            ("load", lambda conf_d: load(reference_find(conf_d))),
+            ("load_apps", with_load_apps),
+            ("bundle", with_bundle),
+            ("cached_parser", with_cached_parser),
+            ("layer_store", with_layer_store),
+        ]
+
+    def lookup(self, config, path):
+        for key in path:
+            config = config[key]
+        return config